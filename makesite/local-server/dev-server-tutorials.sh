@@ -3,10 +3,8 @@
 . "$PYTCH_REPO_BASE"/pytch-build/venv/bin/activate
 cd "$PYTCH_REPO_BASE"/pytch-tutorials
 
-pytchbuild-gather-tutorials --index-source=RECIPES_TIP -o /tmp/pytch-tutorials.zip
-mkdir -p site-layer
+pytchbuild-gather-tutorials --index-source=RECIPES_TIP --output-dir site-layer
 cd site-layer
-unzip -o /tmp/pytch-tutorials.zip
 
 echo Serving tutorial layer from $(pwd)
 
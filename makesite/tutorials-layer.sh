@@ -11,11 +11,10 @@ REPO_ROOT="$(realpath "$BUILD_DIR"/..)"
 cd "$REPO_ROOT"
 
 LAYER_WORKDIR="$REPO_ROOT"/website-layer
-CONTENT_DIR="$LAYER_WORKDIR"/layer-content
 
-if [ -e venv -o -e "$CONTENT_DIR" ]; then
+if [ -e venv ]; then
     echo "Must be run in a clean clone"
-    echo '(i.e., no "venv" or "website-layer/layer-content")'
+    echo '(i.e., no "venv")'
     exit 1
 fi
 
@@ -41,25 +40,17 @@ LAYER_ZIPFILE="$LAYER_WORKDIR"/layer.zip
     # "release-recipes".
 
     if [ "$(git rev-parse --abbrev-ref HEAD)" = release-recipes ]; then
-        pytchbuild-gather-tutorials \
-            --index-source=RECIPES_TIP \
-            -o "$LAYER_ZIPFILE"
+        SOURCE_ARGS=(--index-source=RECIPES_TIP)
     else
-        pytchbuild-gather-tutorials \
-            --from-release HEAD \
-            -o "$LAYER_ZIPFILE"
+        SOURCE_ARGS=(--from-release HEAD)
     fi
-)
-
-# We need the content in a "tutorials" directory.  Seems a bit
-# annoying to unzip and then re-zip the contents but it does the job.
 
-mkdir -p "$CONTENT_DIR"/tutorials/"$PYTCH_DEPLOYMENT_ID"
-unzip -q -d "$CONTENT_DIR"/tutorials/"$PYTCH_DEPLOYMENT_ID" "$LAYER_ZIPFILE"
-rm "$LAYER_ZIPFILE"
-(
-    cd "$CONTENT_DIR"
-    find tutorials -type d -print0 | xargs -0 chmod 755
-    find tutorials -type f -print0 | xargs -0 chmod 644
-    zip -q -r "$LAYER_ZIPFILE" tutorials
+    # We need the content in a "tutorials/$PYTCH_DEPLOYMENT_ID"
+    # directory, with every file readable by all; "--deterministic"
+    # gives all files permissions 644.
+    pytchbuild-gather-tutorials \
+        "${SOURCE_ARGS[@]}" \
+        --path-prefix tutorials/"$PYTCH_DEPLOYMENT_ID" \
+        --deterministic \
+        -o "$LAYER_ZIPFILE"
 )
@@ -1 +1,3 @@
 """Top-level package for Pytch Build Tools"""
+
+__version__ = "0.1.0"
@@ -13,6 +13,11 @@ from .tutorialcompiler.fromgitrepo import (
 )
 from .tutorialcompiler.fromgitrepo.tutorial_history import ProjectHistory
 from .tutorialcompiler.fromgitrepo.errors import TutorialStructureError
+from .tutorialcompiler.fromgitrepo.zip_writer import (
+    CompressionPolicy,
+    DEFAULT_DEFLATE_LEVEL,
+)
+from .tutorialcompiler.fromgitrepo.sidecar_writer import SIDECAR_ENCODINGS
 
 
 log_handler = colorlog.StreamHandler()
@@ -57,7 +62,58 @@ logger.addHandler(log_handler)
     default="bundle-zipfile",
     help="what to write: the full bundle zipfile, or just the HTML fragment",
 )
-def main(output_file, repository_path, tip_revision, tutorial_text_source, output_format):
+@click.option(
+    "--deflate-level",
+    type=click.IntRange(min=0, max=9),
+    default=DEFAULT_DEFLATE_LEVEL,
+    help="how hard to compress HTML and JSON files in the zipfile",
+)
+@click.option(
+    "--compression-stats",
+    is_flag=True,
+    default=False,
+    help="report sizes and times, by category, of the zipfile's contents",
+)
+@click.option(
+    "--zip-threads",
+    type=click.IntRange(min=1),
+    default=1,
+    help="number of threads to compress the zipfile's contents with",
+)
+@click.option(
+    "--deterministic",
+    is_flag=True,
+    default=False,
+    help="write a byte-for-byte reproducible zipfile (fixed timestamps etc.)",
+)
+@click.option(
+    "--precompress",
+    type=click.Choice(sorted(SIDECAR_ENCODINGS)),
+    multiple=True,
+    metavar="ENCODING",
+    help=("also write a copy of each HTML and JSON file compressed with"
+          " ENCODING (gzip, bzip2, or xz); can be given more than once"),
+)
+@click.option(
+    "--code-snapshots",
+    is_flag=True,
+    default=False,
+    help=("write each distinct version of the tutorial's code once, to"
+          " \"code-snapshots.json\", rather than within its HTML"),
+)
+def main(
+        output_file,
+        repository_path,
+        tip_revision,
+        tutorial_text_source,
+        output_format,
+        deflate_level,
+        compression_stats,
+        zip_threads,
+        deterministic,
+        precompress,
+        code_snapshots,
+):
     if repository_path is None:
         raise click.UsageError(
             "\nUnable to discover repository.  Please specify one\n"
@@ -70,17 +126,28 @@ def main(output_file, repository_path, tip_revision, tutorial_text_source, outpu
 
     try:
         if output_format == "bundle-zipfile":
-            compile_fun = compile_fromgitrepo
+            zip_writer = compile_fromgitrepo(
+                output_file,
+                repository_path,
+                tip_revision,
+                tutorial_text_source,
+                CompressionPolicy(text_deflate_level=deflate_level),
+                zip_threads,
+                deterministic,
+                precompress,
+                code_snapshots,
+            )
+            if compression_stats:
+                for line in zip_writer.stats_lines:
+                    click.echo(line, err=True)
         elif output_format == "html-only":
-            compile_fun = compile_html_only_fromgitrepo
+            compile_html_only_fromgitrepo(output_file,
+                                          repository_path,
+                                          tip_revision,
+                                          tutorial_text_source)
         else:
             # (Shouldn't happen, because Click should enforce valid choice.)
             raise click.UsageError(f"unknown output_format \"{output_format}\"")
-
-        compile_fun(output_file,
-                    repository_path,
-                    tip_revision,
-                    tutorial_text_source)
     except TutorialStructureError as err:
         colorlog.error(str(err))
         return 1
@@ -1,17 +1,64 @@
 import pygit2
 import click
+from contextlib import closing
 
-from .tutorialcompiler.fromgitrepo import git_repository
 from .tutorialcompiler.gather_tutorials import TutorialCollection, commit_to_releases
+from .tutorialcompiler.fromgitrepo.zip_writer import (
+    CompressionPolicy,
+    DEFAULT_DEFLATE_LEVEL,
+)
+from .tutorialcompiler.fromgitrepo.sidecar_writer import SIDECAR_ENCODINGS
 
 
 @click.command()
 @click.option(
     "-o", "--output-file",
     type=click.File(mode="wb"),
-    required=True,
     help=("where to write the zipfile containing the tutorial collection"),
 )
+@click.option(
+    "--output-dir",
+    type=click.Path(file_okay=False),
+    default=None,
+    help=("directory to write the tutorial collection into, instead of a"
+          " zipfile; only files whose contents have changed are rewritten,"
+          " and files no longer in the collection are left in place unless"
+          " --delete-stale is given"),
+)
+@click.option(
+    "--delete-stale",
+    is_flag=True,
+    default=False,
+    help=("with --output-dir, delete files under the collection's directory"
+          " (see --path-prefix) which are not part of the collection"),
+)
+@click.option(
+    "--path-prefix",
+    default="",
+    metavar="PATH",
+    help="directory, within the output, to put the tutorial collection in",
+)
+@click.option(
+    "--dedup-assets",
+    is_flag=True,
+    default=False,
+    help=("write each distinct project asset once, to a store shared by all"
+          " tutorials"),
+)
+@click.option(
+    "--rich-asset-manifest",
+    is_flag=True,
+    default=False,
+    help=("describe each project asset's size, hash, MIME type, and (for"
+          " images) dimensions in its tutorial's \"project-assets.json\""),
+)
+@click.option(
+    "--code-snapshots",
+    is_flag=True,
+    default=False,
+    help=("write each distinct version of a tutorial's code once, to its"
+          " \"code-snapshots.json\", rather than within its HTML"),
+)
 @click.option(
     "-r", "--repository-path",
     default=pygit2.discover_repository("."),
@@ -36,7 +83,103 @@ from .tutorialcompiler.gather_tutorials import TutorialCollection, commit_to_rel
     default=None,
     help='recreate the bundle as of a particular "releases" revision',
 )
-def main(output_file, repository_path, index_source, make_release, from_release):
+@click.option(
+    "-j", "--jobs",
+    type=click.IntRange(min=1),
+    default=1,
+    help="number of worker processes to build tutorials with",
+)
+@click.option(
+    "--plan",
+    is_flag=True,
+    default=False,
+    help="only report which tutorials would be rebuilt and which are cached",
+)
+@click.option(
+    "--deflate-level",
+    type=click.IntRange(min=0, max=9),
+    default=None,  # Set default manually, to tell whether user gave option
+    help=("how hard to compress HTML and JSON files in the zipfile"
+          f" (default {DEFAULT_DEFLATE_LEVEL})"),
+)
+@click.option(
+    "--compression-stats",
+    is_flag=True,
+    default=False,
+    help="report sizes and times, by category, of the zipfile's contents",
+)
+@click.option(
+    "--zip-threads",
+    type=click.IntRange(min=1),
+    default=None,  # Set default manually, to tell whether user gave option
+    help="number of threads to compress the zipfile's contents with (default 1)",
+)
+@click.option(
+    "--deterministic",
+    is_flag=True,
+    default=False,
+    help="write a byte-for-byte reproducible zipfile (fixed timestamps etc.)",
+)
+@click.option(
+    "--precompress",
+    type=click.Choice(sorted(SIDECAR_ENCODINGS)),
+    multiple=True,
+    metavar="ENCODING",
+    help=("also write a copy of each HTML and JSON file compressed with"
+          " ENCODING (gzip, bzip2, or xz); can be given more than once"),
+)
+def main(
+        output_file,
+        output_dir,
+        delete_stale,
+        path_prefix,
+        dedup_assets,
+        rich_asset_manifest,
+        code_snapshots,
+        repository_path,
+        index_source,
+        make_release,
+        from_release,
+        jobs,
+        plan,
+        deflate_level,
+        compression_stats,
+        zip_threads,
+        deterministic,
+        precompress,
+):
+    if plan and make_release:
+        raise click.BadArgumentUsage("cannot make a release when only planning")
+    if output_file is not None and output_dir is not None:
+        raise click.BadArgumentUsage(
+            "cannot write both an output file and an output directory"
+        )
+    if output_file is None and output_dir is None and not plan:
+        raise click.UsageError(
+            'Missing option "-o" / "--output-file" or "--output-dir".'
+        )
+    if delete_stale and output_dir is None:
+        raise click.BadArgumentUsage("can only delete stale files in an output directory")
+    if output_dir is not None:
+        zipfile_options_given = [
+            option
+            for option, given in [("--deflate-level", deflate_level is not None),
+                                  ("--zip-threads", zip_threads is not None),
+                                  ("--deterministic", deterministic)]
+            if given
+        ]
+        if zipfile_options_given:
+            raise click.BadArgumentUsage(
+                f"cannot use {', '.join(zipfile_options_given)}"
+                " with an output directory"
+            )
+
+    # Set defaults.
+    if deflate_level is None:
+        deflate_level = DEFAULT_DEFLATE_LEVEL
+    if zip_threads is None:
+        zip_threads = 1
+
     if from_release is not None:
         if make_release:
             raise click.BadArgumentUsage(
@@ -60,10 +203,43 @@ def main(output_file, repository_path, index_source, make_release, from_release)
         else TutorialCollection.from_releases_commit(repository_path, from_release)
     )
 
-    releases_commit_oid = None
+    with closing(tutorials):
+        if plan:
+            for name, is_cached in tutorials.build_plan(code_snapshots):
+                click.echo(f"{'cached' if is_cached else 'rebuild':8} {name}")
+            return
+
+        releases_commit_oid = None
 
-    if make_release:
-        with git_repository(repository_path) as repo:
-            releases_commit_oid = commit_to_releases(repo, tutorials)
+        if make_release:
+            releases_commit_oid = commit_to_releases(tutorials.repo, tutorials)
 
-    tutorials.write_new_zipfile(releases_commit_oid, output_file)
+        if output_dir is not None:
+            writer = tutorials.write_to_directory(
+                releases_commit_oid,
+                output_dir,
+                jobs,
+                path_prefix,
+                dedup_assets,
+                rich_asset_manifest,
+                precompress,
+                code_snapshots,
+                delete_stale,
+            )
+        else:
+            writer = tutorials.write_new_zipfile(
+                releases_commit_oid,
+                output_file,
+                jobs,
+                CompressionPolicy(text_deflate_level=deflate_level),
+                zip_threads,
+                deterministic,
+                path_prefix,
+                dedup_assets,
+                rich_asset_manifest,
+                precompress,
+                code_snapshots,
+            )
+        if compression_stats:
+            for line in writer.stats_lines:
+                click.echo(line, err=True)
@@ -3,7 +3,7 @@
 TODO: Complete these docs.
 """
 
-from contextlib import contextmanager
+from contextlib import closing, contextmanager
 import pygit2
 
 
@@ -12,13 +12,31 @@ from .tutorial_bundle import TutorialBundle
 from .tutorial_html_fragment import tutorial_div_from_project_history
 
 
-def compile(zipfile_out, git_repo_path, tip_revision, tutorial_text_source):
+def compile(
+        zipfile_out,
+        git_repo_path,
+        tip_revision,
+        tutorial_text_source,
+        compression_policy=None,
+        n_zip_threads=1,
+        deterministic=False,
+        sidecar_encodings=(),
+        separate_code_snapshots=False,
+):
     project_history = ProjectHistory(git_repo_path,
                                      tip_revision,
                                      tutorial_text_source)
 
-    bundle = TutorialBundle.from_project_history(project_history)
-    bundle.write_new_zipfile(zipfile_out)
+    with closing(project_history):
+        bundle = TutorialBundle.from_project_history_using_cache(
+            project_history,
+            separate_code_snapshots,
+        )
+        return bundle.write_new_zipfile(zipfile_out,
+                                        compression_policy,
+                                        n_zip_threads,
+                                        deterministic,
+                                        sidecar_encodings)
 
 
 def compile_html_only(
@@ -30,7 +48,8 @@ def compile_html_only(
     project_history = ProjectHistory(git_repo_path,
                                      tip_revision,
                                      tutorial_text_source)
-    tutorial_html = tutorial_div_from_project_history(project_history)
+    with closing(project_history):
+        tutorial_html = tutorial_div_from_project_history(project_history)
 
     # We have this file as binary; explicitly encode.
     html_fragment_out.write(tutorial_html.encode("utf-8"))
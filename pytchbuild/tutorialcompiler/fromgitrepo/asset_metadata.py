@@ -0,0 +1,80 @@
+"""Metadata of assets, for the front end's benefit
+
+The MIME type is guessed from the asset's path.  The pixel dimensions of PNG,
+GIF, and JPEG images are read from their headers, without decoding the image.
+"""
+
+import mimetypes
+import struct
+
+
+DEFAULT_MIME_TYPE = "application/octet-stream"
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+GIF_SIGNATURES = (b"GIF87a", b"GIF89a")
+JPEG_SOI = b"\xff\xd8"
+
+# Start-of-frame markers, which hold the image's dimensions.  The others in
+# the range 0xC0--0xCF (DHT, JPG, DAC) do not.
+JPEG_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+# Markers which stand alone, without a length or payload.
+JPEG_STANDALONE_MARKERS = frozenset(range(0xD0, 0xD8)) | {0x01}
+
+
+def mime_type(path):
+    guessed_type, _ = mimetypes.guess_type(path, strict=False)
+    return guessed_type if guessed_type is not None else DEFAULT_MIME_TYPE
+
+
+def image_dimensions(data):
+    """The ``(width, height)`` of the PNG, GIF, or JPEG image *data*
+
+    The *data* can be ``bytes`` or a ``memoryview``.  Return ``None`` if the
+    data is not an image of one of those kinds, or its header is malformed.
+    """
+    if data[:8] == PNG_SIGNATURE:
+        return png_dimensions(data)
+    if data[:6] in GIF_SIGNATURES:
+        return gif_dimensions(data)
+    if data[:2] == JPEG_SOI:
+        return jpeg_dimensions(data)
+    return None
+
+
+def png_dimensions(data):
+    # The first chunk must be IHDR, whose data starts with width and height.
+    if len(data) < 24 or data[12:16] != b"IHDR":
+        return None
+    return struct.unpack(">II", data[16:24])
+
+
+def gif_dimensions(data):
+    if len(data) < 10:
+        return None
+    return struct.unpack("<HH", data[6:10])
+
+
+def jpeg_dimensions(data):
+    # Walk the segments following the start-of-image marker until we find a
+    # start-of-frame segment.
+    offset = 2
+    while offset + 4 <= len(data):
+        if data[offset] != 0xFF:
+            return None
+        marker = data[offset + 1]
+        if marker == 0xFF:
+            # Fill byte before a marker.
+            offset += 1
+            continue
+        if marker in JPEG_STANDALONE_MARKERS:
+            offset += 2
+            continue
+        (segment_length,) = struct.unpack(">H", data[offset + 2:offset + 4])
+        if marker in JPEG_SOF_MARKERS:
+            if offset + 9 > len(data):
+                return None
+            height, width = struct.unpack(">HH", data[offset + 5:offset + 9])
+            return width, height
+        offset += 2 + segment_length
+    return None
@@ -0,0 +1,89 @@
+"""In-process cache of blob contents, keyed by blob id
+
+The same blob is often wanted many times during a build; for example, the
+``code.py`` as of some commit is needed both for that commit's patch element
+and (if it is the tip) for the tutorial's final code.  Different tutorials in a
+collection also often share identical files.  A blob's id determines its
+contents, so the one cache can be shared by everything in the process,
+regardless of which repository or history is asking.
+"""
+
+from collections import OrderedDict
+
+
+class BlobCache:
+    """Bounded least-recently-used cache of blobs' bytes and decoded text
+
+    The bound is on the total size, in bytes, of the cached data plus the
+    length of any decoded text.  Counts of hits and misses are kept for
+    profiling; see :py:attr:`stats`.
+    """
+
+    def __init__(self, max_size=64 << 20):
+        self.max_size = max_size
+        self.entry_from_id = OrderedDict()
+        self.total_size = 0
+        self.n_hits = 0
+        self.n_misses = 0
+
+    def entry(self, repo, blob_id):
+        key = str(blob_id)
+        maybe_entry = self.entry_from_id.get(key)
+        if maybe_entry is not None:
+            self.n_hits += 1
+            self.entry_from_id.move_to_end(key)
+            return maybe_entry
+
+        self.n_misses += 1
+        entry = {"data": repo[blob_id].data, "text": None}
+        self.store(key, entry, len(entry["data"]))
+        return entry
+
+    def store(self, key, entry, size):
+        if size > self.max_size:
+            return
+        self.entry_from_id[key] = entry
+        self.total_size += size
+        while self.total_size > self.max_size:
+            _, evicted_entry = self.entry_from_id.popitem(last=False)
+            self.total_size -= self.entry_size(evicted_entry)
+
+    @staticmethod
+    def entry_size(entry):
+        text = entry["text"]
+        return len(entry["data"]) + (0 if text is None else len(text))
+
+    def data(self, repo, blob_id):
+        """The bytes of the blob with the given id"""
+        return self.entry(repo, blob_id)["data"]
+
+    def text(self, repo, blob_id):
+        """The contents of the blob with the given id, decoded as UTF-8"""
+        entry = self.entry(repo, blob_id)
+        if entry["text"] is None:
+            entry["text"] = entry["data"].decode("utf-8")
+            key = str(blob_id)
+            if key in self.entry_from_id:
+                self.entry_from_id.pop(key)
+                self.total_size -= len(entry["data"])
+                self.store(key, entry, self.entry_size(entry))
+        return entry["text"]
+
+    @property
+    def stats(self):
+        return {
+            "n_entries": len(self.entry_from_id),
+            "total_size": self.total_size,
+            "n_hits": self.n_hits,
+            "n_misses": self.n_misses,
+        }
+
+    def clear(self):
+        self.entry_from_id.clear()
+        self.total_size = 0
+        self.n_hits = 0
+        self.n_misses = 0
+
+
+# The cache shared by all ProjectHistory instances in this process.
+shared_blob_cache = BlobCache()
@@ -0,0 +1,108 @@
+"""Persistent cache of intermediate build results
+
+Much of the work of compiling a tutorial is a pure function of immutable git
+objects.  For example, the deltas a commit makes against its parent can never
+change once that commit exists.  Such results are kept in a small SQLite
+database inside the repository's git directory, under ``pytchbuild-cache/``,
+keyed by the relevant object id(s).  Namespaces whose keys are not so
+stable, such as that of built tutorials, are bounded in size.  The whole
+cache can be cleared by deleting its directory.
+
+Values are stored as JSON, grouped into *namespaces* so that different kinds
+of result can share the one database.
+"""
+
+import json
+import sqlite3
+from pathlib import Path
+import colorlog
+
+logger = colorlog.getLogger(__name__)
+
+
+CACHE_DIRNAME = "pytchbuild-cache"
+CACHE_FILENAME = "cache.sqlite3"
+
+
+class BuildCache:
+    """Key/value store of JSON-able values, grouped into namespaces
+
+    Constructed from the path of the database file, or from ``None`` for a
+    cache which lasts only as long as the instance.  Usually constructed via
+    :py:meth:`for_repository`.
+    """
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path
+        self.connection = sqlite3.connect(
+            ":memory:" if db_path is None else str(db_path),
+            timeout=30,
+        )
+        # This is only a cache, so trade durability for speed.
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " namespace TEXT NOT NULL,"
+                " key TEXT NOT NULL,"
+                " value TEXT NOT NULL,"
+                " PRIMARY KEY (namespace, key))"
+            )
+
+    @classmethod
+    def for_repository(cls, repo):
+        """The cache living within the git directory of the given *repo*
+
+        If the cache cannot be opened (e.g., the repository is read-only),
+        warn and fall back to an in-memory cache.
+        """
+        cache_dir = Path(repo.path) / CACHE_DIRNAME
+        try:
+            cache_dir.mkdir(exist_ok=True)
+            return cls(cache_dir / CACHE_FILENAME)
+        except (OSError, sqlite3.Error) as err:
+            logger.warning(f"could not open build cache in \"{cache_dir}\""
+                           f" ({err}); using in-memory cache")
+            return cls()
+
+    def get(self, namespace, key):
+        """The value stored under *key* in *namespace*, or ``None``"""
+        row = self.connection.execute(
+            "SELECT value FROM entries WHERE namespace = ? AND key = ?",
+            (namespace, key),
+        ).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def put(self, namespace, key, value, max_n_entries=None):
+        """Store *value*, which must be JSON-able, under *key* in *namespace*
+
+        If *max_n_entries* is given, then also discard all but that many of the
+        most recently stored entries in *namespace*.  This bounds the size of
+        namespaces whose keys depend on things which change during
+        development, such as tutorial texts.
+        """
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?)",
+                (namespace, key, json.dumps(value)),
+            )
+            if max_n_entries is not None:
+                # Re-inserting an entry gives it a new (largest) rowid, so
+                # rowid order is the order in which entries were stored.
+                self.connection.execute(
+                    "DELETE FROM entries WHERE namespace = ? AND rowid NOT IN"
+                    " (SELECT rowid FROM entries WHERE namespace = ?"
+                    "  ORDER BY rowid DESC LIMIT ?)",
+                    (namespace, namespace, max_n_entries),
+                )
+
+    def n_entries(self, namespace):
+        """The number of entries stored in *namespace*"""
+        return self.connection.execute(
+            "SELECT COUNT(*) FROM entries WHERE namespace = ?",
+            (namespace,),
+        ).fetchone()[0]
+
+    def close(self):
+        self.connection.close()
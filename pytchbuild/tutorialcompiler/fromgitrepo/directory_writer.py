@@ -0,0 +1,124 @@
+"""Writing of output straight into a directory tree
+
+An alternative to :py:class:`ZipWriter` with the same interface, for when the
+output is wanted unpacked, e.g., to be served by a development web server or
+to be uploaded file-by-file.  Files whose content is already as wanted are
+left alone, so repeated builds only touch what has changed.  Files which are
+no longer written (e.g., of a tutorial removed from the collection) are left
+in place unless asked for otherwise.
+"""
+
+from pathlib import Path
+import hashlib
+import os
+import time
+import pygit2
+
+from .zip_writer import CategoryStats, prefixed_path
+
+
+def git_blob_oid_hex(data):
+    """The oid git would give a blob with content *data* (bytes or memoryview)
+
+    Computed directly rather than via ``pygit2.hash()``, which does not accept
+    a ``memoryview``.
+    """
+    oid_hash = hashlib.sha1(f"blob {len(data)}\0".encode("ascii"))
+    oid_hash.update(data)
+    return oid_hash.hexdigest()
+
+
+class DirectoryWriter:
+    """Write members as files under *out_dir*, rewriting only changed ones
+
+    A file is taken to be unchanged if it has the same size and git blob oid
+    as the new content.  Written files get permissions ``0644`` and any
+    directories created get ``0755``.  Files already in the tree but not
+    written by this writer are left alone.
+
+    If *delete_stale* is true, then on :py:meth:`close`, every file under the
+    directory *path_prefix* of *out_dir* (or under *out_dir* itself, if there
+    is no prefix) which was not written by this writer is deleted, as are any
+    directories left empty.
+
+    Statistics of files ``"written"``, ``"unchanged"``, and ``"deleted"`` are
+    accumulated in ``stats``, as for :py:class:`ZipWriter`.
+    """
+
+    def __init__(self, out_dir, path_prefix="", delete_stale=False):
+        self.out_dir = Path(out_dir)
+        self.path_prefix = path_prefix
+        self.delete_stale = delete_stale
+        self.written_paths = set()
+        self.stats = {}
+
+    def record_stats(self, category, n_bytes_in, n_bytes_out, seconds):
+        stats = self.stats.setdefault(category, CategoryStats())
+        stats.n_members += 1
+        stats.n_bytes_in += n_bytes_in
+        stats.n_bytes_out += n_bytes_out
+        stats.seconds += seconds
+
+    def write(self, path, data):
+        t0 = time.perf_counter()
+        out_path = self.out_dir / prefixed_path(self.path_prefix, path)
+        self.written_paths.add(out_path)
+
+        if self.file_has_content(out_path, data):
+            category = "unchanged"
+            n_bytes_out = 0
+        else:
+            category = "written"
+            n_bytes_out = len(data)
+            self.write_file(out_path, data)
+
+        self.record_stats(category, len(data), n_bytes_out, time.perf_counter() - t0)
+
+    @staticmethod
+    def file_has_content(path, data):
+        try:
+            if path.stat().st_size != len(data):
+                return False
+        except FileNotFoundError:
+            return False
+        return str(pygit2.hashfile(str(path))) == git_blob_oid_hex(data)
+
+    @staticmethod
+    def write_file(path, data):
+        """Write *data* to *path* via a temporary file, so readers of *path*
+        never see a partly-written file
+        """
+        path.parent.mkdir(mode=0o755, parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        with tmp_path.open("wb") as f_out:
+            f_out.write(data)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if self.delete_stale:
+            self.delete_stale_files()
+
+    def delete_stale_files(self):
+        root_dir = self.out_dir / self.path_prefix.strip("/")
+        if not root_dir.is_dir():
+            return
+        for dir_path, _, file_names in os.walk(root_dir, topdown=False):
+            dir_path = Path(dir_path)
+            for file_name in file_names:
+                path = dir_path / file_name
+                if path not in self.written_paths:
+                    t0 = time.perf_counter()
+                    n_bytes = path.stat().st_size
+                    path.unlink()
+                    self.record_stats("deleted", n_bytes, 0, time.perf_counter() - t0)
+            if dir_path != root_dir and not any(dir_path.iterdir()):
+                dir_path.rmdir()
+
+    @property
+    def stats_lines(self):
+        return [f"{category}: {stats}"
+                for category, stats in sorted(self.stats.items())]
@@ -0,0 +1,100 @@
+"""Writing of pre-compressed copies of text files, for static serving
+
+A web server can serve, e.g., ``tutorial.html.gz`` in place of
+``tutorial.html`` to a client which accepts gzip encoding, without having to
+compress the file for each request.  A :py:class:`SidecarWriter` wraps another
+writer (a :py:class:`ZipWriter` or :py:class:`DirectoryWriter`), and writes
+such compressed "sidecar" files alongside the HTML and JSON files.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from pathlib import PurePosixPath
+import bz2
+import gzip
+import io
+import lzma
+
+
+def gzip_compress(data):
+    # Fixed mtime and no filename, so the output depends only on the data.
+    out_file = io.BytesIO()
+    with gzip.GzipFile(filename="", mode="wb", fileobj=out_file, mtime=0) as f_out:
+        f_out.write(data)
+    return out_file.getvalue()
+
+
+# For each encoding, the suffix of its sidecar files and the function which
+# compresses data with it.  Only gzip is understood by browsers; the others
+# are for servers or clients which can use them.
+SIDECAR_ENCODINGS = {
+    "gzip": (".gz", gzip_compress),
+    "bzip2": (".bz2", bz2.compress),
+    "xz": (".xz", lzma.compress),
+}
+
+
+class SidecarWriter:
+    """Wrap *inner_writer*, also writing compressed copies of text files
+
+    For each member written whose suffix is in ``SIDECAR_SUFFIXES``, write,
+    straight after it, a sidecar for each of the given *encodings*, which
+    must be keys of ``SIDECAR_ENCODINGS``.  The compression is done in a pool
+    of *n_threads* threads, while the caller goes on to build and write other
+    members; all members, including sidecars, reach *inner_writer* in a fixed
+    order.
+    """
+
+    SIDECAR_SUFFIXES = frozenset([".html", ".json"])
+
+    # Number of members, per thread, which can be waiting for their sidecars.
+    MAX_PENDING_PER_THREAD = 4
+
+    def __init__(self, inner_writer, encodings=("gzip",), n_threads=2):
+        self.inner_writer = inner_writer
+        self.encodings = list(encodings)
+        self.executor = ThreadPoolExecutor(max_workers=n_threads)
+        self.max_n_pending = n_threads * self.MAX_PENDING_PER_THREAD
+        self.pending_members = deque()
+
+    @property
+    def stats(self):
+        return self.inner_writer.stats
+
+    @property
+    def stats_lines(self):
+        return self.inner_writer.stats_lines
+
+    def write(self, path, data):
+        if PurePosixPath(path).suffix in self.SIDECAR_SUFFIXES:
+            future = self.executor.submit(self.sidecars, path, data)
+        else:
+            future = None
+        self.pending_members.append((path, data, future))
+        while len(self.pending_members) > self.max_n_pending:
+            self.write_next_pending_member()
+
+    def sidecars(self, path, data):
+        """List of ``(path, data)`` pairs for the sidecars of the given member"""
+        sidecars = []
+        for encoding in self.encodings:
+            suffix, compress = SIDECAR_ENCODINGS[encoding]
+            sidecars.append((path + suffix, compress(data)))
+        return sidecars
+
+    def write_next_pending_member(self):
+        path, data, future = self.pending_members.popleft()
+        self.inner_writer.write(path, data)
+        if future is not None:
+            for sidecar_path, sidecar_data in future.result():
+                self.inner_writer.write(sidecar_path, sidecar_data)
+
+    def flush(self):
+        while self.pending_members:
+            self.write_next_pending_member()
+        self.inner_writer.flush()
+
+    def close(self):
+        self.flush()
+        self.executor.shutdown()
+        self.inner_writer.close()
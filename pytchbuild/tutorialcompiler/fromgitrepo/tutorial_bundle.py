@@ -1,57 +1,326 @@
-from dataclasses import dataclass
-from typing import List
-from contextlib import closing
-from pathlib import Path
-import zipfile
-import bs4
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+from contextlib import closing, contextmanager
+from pathlib import Path, PurePosixPath
+import logging
 import json
+import hashlib
 
 from .tutorial_history import Asset
+from . import tutorial_markdown
+from .zip_writer import ZipWriter
+from .sidecar_writer import SidecarWriter
 from .tutorial_html_fragment import (
-    tutorial_div_from_project_history,
+    tutorial_div_and_n_chapters_from_project_history,
     summary_div_from_project_history,
 )
 
 
+# Parent of the loggers of all modules which build a bundle.
+BUILD_LOGGER_NAME = __name__.rpartition(".")[0]
+
+
+class RecordingHandler(logging.Handler):
+    def __init__(self):
+        super().__init__(logging.WARNING)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append((record.name, record.levelno, record.getMessage()))
+
+
+@contextmanager
+def recorded_build_warnings():
+    """Context yielding a list of the warnings logged while building
+
+    Each is a ``(logger_name, level, message)`` triple.  The warnings are
+    still logged as usual.
+    """
+    handler = RecordingHandler()
+    logger = logging.getLogger(BUILD_LOGGER_NAME)
+    logger.addHandler(handler)
+    try:
+        yield handler.records
+    finally:
+        logger.removeHandler(handler)
+
+
+def html_from_div(div):
+    """The HTML for *div*, which is then decomposed
+
+    A soup's elements refer to each other in cycles, so would otherwise stay
+    in memory until the next garbage collection.
+    """
+    html = str(div)
+    div.decompose()
+    return html
+
+
+class SharedAssetStore:
+    """Content-addressed store of assets, shared by all tutorials in a collection
+
+    Each distinct asset is written once, as ``assets/<blob-id><suffix>``, no
+    matter how many tutorials use it.
+    """
+
+    DIRECTORY_NAME = "assets"
+
+    def __init__(self):
+        self.written_paths = set()
+
+    def path_of_asset(self, asset):
+        suffix = PurePosixPath(asset.path).suffix.lower()
+        return f"{self.DIRECTORY_NAME}/{asset.blob_id}{suffix}"
+
+    def write_asset(self, zip_writer, asset):
+        """Write *asset*'s bytes via *zip_writer*, unless already written"""
+        path = self.path_of_asset(asset)
+        if path not in self.written_paths:
+            zip_writer.write(path, memoryview(asset.repo[asset.blob_id]))
+            self.written_paths.add(path)
+
+
 @dataclass
 class TutorialBundle:
+    """Everything needed to write one tutorial's output
+
+    The HTML fragments are held already serialised, and the assets are
+    references to blobs, so a bundle can be built in one process and pickled
+    back to another for writing.  A bundle which has crossed a process boundary
+    needs :py:meth:`attach_repository` before its assets can be written.
+
+    A bundle is a pure function of the tip commit, the tutorial and summary
+    texts, and the versions of the software building it, so can be stored in
+    the history's :py:class:`BuildCache` under a key derived from those; see
+    :py:meth:`from_project_history_using_cache`.
+
+    If built with *separate_code_snapshots*, the versions of the Python code
+    are not held within the tutorial HTML, but in ``code_snapshots``, a dict
+    mapping blob id to code text, written as ``code-snapshots.json``; see
+    :py:func:`tutorial_div_from_project_history`.
+
+    The warnings logged while building the bundle (e.g., of commit-slugs not
+    used in the tutorial) are kept in ``build_warnings``, and logged again
+    whenever the bundle is taken from the cache; see
+    :py:meth:`log_build_warnings`.
+    """
+
+    BUILD_CACHE_NAMESPACE = "tutorial-bundles"
+
+    # Each edit of a tutorial's text gives a new bundle, so keep only the most
+    # recently built.
+    BUILD_CACHE_MAX_N_ENTRIES = 256
+
     top_level_directory_name: Path
-    tutorial_html: bs4.element.Tag
-    summary_html: bs4.element.Tag
+    tutorial_html: str
+    summary_html: str
     assets: List[Asset]
+    n_chapters: int
+    code_snapshots: Optional[Dict[str, str]] = None
+    build_warnings: List[Tuple[str, int, str]] = field(default_factory=list)
 
     @classmethod
-    def from_project_history(cls, project_history):
+    def from_project_history(cls, project_history, separate_code_snapshots=False):
+        code_snapshots = {} if separate_code_snapshots else None
+        with recorded_build_warnings() as build_warnings:
+            tutorial_div, n_chapters = (
+                tutorial_div_and_n_chapters_from_project_history(project_history,
+                                                                 code_snapshots)
+            )
+            summary_div = summary_div_from_project_history(project_history)
         return cls(
             Path(project_history.top_level_directory_name),
-            tutorial_div_from_project_history(project_history),
-            summary_div_from_project_history(project_history),
-            project_history.all_assets
+            html_from_div(tutorial_div),
+            html_from_div(summary_div),
+            project_history.all_assets,
+            n_chapters,
+            code_snapshots,
+            build_warnings,
         )
 
-    def write_to_zipfile(self, out_zipfile):
+    @staticmethod
+    def build_cache_key(project_history, separate_code_snapshots=False):
+        key_parts = tutorial_markdown.rendering_versions() + [
+            project_history.tip_oid_string,
+            project_history.tutorial_text,
+            project_history.summary_text,
+        ]
+        if separate_code_snapshots:
+            key_parts.append("separate-code-snapshots")
+        key_hash = hashlib.sha256()
+        for part in key_parts:
+            key_hash.update(part.encode("utf-8"))
+            key_hash.update(b"\0")
+        return key_hash.hexdigest()
+
+    @classmethod
+    def cached_json_value(cls, project_history, separate_code_snapshots=False):
+        """The stored form of the bundle for *project_history*, or ``None``"""
+        cache_key = cls.build_cache_key(project_history, separate_code_snapshots)
+        return project_history.build_cache.get(cls.BUILD_CACHE_NAMESPACE, cache_key)
+
+    @classmethod
+    def from_project_history_using_cache(
+            cls,
+            project_history,
+            separate_code_snapshots=False,
+    ):
+        """Look up the bundle in the history's cache, building it if absent"""
+        maybe_cached = cls.cached_json_value(project_history,
+                                             separate_code_snapshots)
+        if maybe_cached is not None:
+            bundle = cls.from_json_value(maybe_cached, project_history.repo)
+            bundle.log_build_warnings()
+            return bundle
+
+        bundle = cls.from_project_history(project_history,
+                                          separate_code_snapshots)
+        bundle.store_in_cache(project_history)
+        return bundle
+
+    def store_in_cache(self, project_history):
+        cache_key = self.build_cache_key(project_history,
+                                         self.code_snapshots is not None)
+        project_history.build_cache.put(self.BUILD_CACHE_NAMESPACE,
+                                        cache_key,
+                                        self.as_json_value(),
+                                        self.BUILD_CACHE_MAX_N_ENTRIES)
+
+    def as_json_value(self):
+        return {
+            "top_level_directory_name": str(self.top_level_directory_name),
+            "tutorial_html": self.tutorial_html,
+            "summary_html": self.summary_html,
+            "assets": [[a.path, a.blob_id, a.size] for a in self.assets],
+            "n_chapters": self.n_chapters,
+            "code_snapshots": self.code_snapshots,
+            "build_warnings": self.build_warnings,
+        }
+
+    @classmethod
+    def from_json_value(cls, value, repo):
+        return cls(
+            Path(value["top_level_directory_name"]),
+            value["tutorial_html"],
+            value["summary_html"],
+            [Asset(path, blob_id, size, repo)
+             for path, blob_id, size in value["assets"]],
+            value["n_chapters"],
+            value.get("code_snapshots"),
+            [tuple(w) for w in value.get("build_warnings", [])],
+        )
+
+    def log_build_warnings(self):
+        """Log again the warnings logged when this bundle was built"""
+        for logger_name, level, message in self.build_warnings:
+            logging.getLogger(logger_name).log(level, message)
+
+    def attach_repository(self, repo):
+        for asset in self.assets:
+            asset.repo = repo
+
+    @property
+    def n_bytes(self):
+        """Sizes of the bundle's HTML files and of all its assets together"""
+        return {
+            "tutorial_html": len(self.tutorial_html.encode("utf-8")),
+            "summary_html": len(self.summary_html.encode("utf-8")),
+            "assets": sum(asset.size for asset in self.assets),
+            "code_snapshots": (0 if self.code_snapshots is None
+                               else len(self.code_snapshots_json_bytes())),
+        }
+
+    def code_snapshots_json_bytes(self):
+        return json.dumps(self.code_snapshots).encode("utf-8")
+
+    def assets_manifest(self, shared_asset_store=None, rich_asset_manifest=False):
+        """The content for the bundle's ``project-assets.json``
+
+        By default, a list of the project assets' paths.  If
+        *rich_asset_manifest* is true, a list of dictionaries, each as given
+        by :py:meth:`Asset.manifest_entry`.  If a :py:class:`SharedAssetStore`
+        is given, each asset's path in the store is included: as a
+        ``shared_path`` entry in rich manifests, or else by making the
+        manifest a dictionary from each asset's path to its shared path.
+        """
+        project_assets = [a for a in self.assets if a.is_project_asset]
+
+        if rich_asset_manifest:
+            entries = [a.manifest_entry() for a in project_assets]
+            if shared_asset_store is not None:
+                for asset, entry in zip(project_assets, entries):
+                    entry["shared_path"] = shared_asset_store.path_of_asset(asset)
+            return entries
+
+        if shared_asset_store is None:
+            return [a.path for a in project_assets]
+
+        return {a.path: shared_asset_store.path_of_asset(a) for a in project_assets}
+
+    def write_to_zipfile(
+            self,
+            zip_writer,
+            shared_asset_store=None,
+            rich_asset_manifest=False,
+    ):
+        """Write the bundle's files via *zip_writer*
+
+        The HTML, manifest, and code-snapshot files come first, followed by the
+        assets in order of their paths, so the order does not depend on the
+        order in which the tutorial's history added them.
+
+        If a :py:class:`SharedAssetStore` is given, project assets are written
+        into it rather than into the bundle's directory.  See
+        :py:meth:`assets_manifest` for the effect of that and of
+        *rich_asset_manifest* on ``project-assets.json``.
+        """
         bundle_root_path = Path(self.top_level_directory_name)
 
         tutorial_html_path = bundle_root_path / "tutorial.html"
         tutorial_html_bytes = self.tutorial_html.encode("utf-8")
-        out_zipfile.writestr(str(tutorial_html_path), tutorial_html_bytes)
+        zip_writer.write(str(tutorial_html_path), tutorial_html_bytes)
 
         summary_html_path = bundle_root_path / "summary.html"
         summary_html_bytes = self.summary_html.encode("utf-8")
-        out_zipfile.writestr(str(summary_html_path), summary_html_bytes)
+        zip_writer.write(str(summary_html_path), summary_html_bytes)
 
-        project_asset_paths = [a.path for a in self.assets if a.is_project_asset]
+        assets_manifest = self.assets_manifest(shared_asset_store,
+                                               rich_asset_manifest)
         assets_manifest_path = bundle_root_path / "project-assets.json"
-        assets_manifest_bytes = json.dumps(project_asset_paths).encode("utf-8")
-        out_zipfile.writestr(str(assets_manifest_path), assets_manifest_bytes)
+        assets_manifest_bytes = json.dumps(assets_manifest).encode("utf-8")
+        zip_writer.write(str(assets_manifest_path), assets_manifest_bytes)
 
-        for asset in self.assets:
-            out_zipfile.writestr(asset.path, asset.data)
+        if self.code_snapshots is not None:
+            code_snapshots_path = bundle_root_path / "code-snapshots.json"
+            zip_writer.write(str(code_snapshots_path),
+                             self.code_snapshots_json_bytes())
+
+        for asset in sorted(self.assets, key=lambda a: a.path):
+            if shared_asset_store is not None and asset.is_project_asset:
+                shared_asset_store.write_asset(zip_writer, asset)
+            else:
+                asset.write_to_zipfile(zip_writer)
 
-    def write_new_zipfile(self, out_file):
-        bare_zfile = zipfile.ZipFile(out_file,
-                                     mode="w",
-                                     compression=zipfile.ZIP_DEFLATED)
+    def write_new_zipfile(
+            self,
+            out_file,
+            compression_policy=None,
+            n_zip_threads=1,
+            deterministic=False,
+            sidecar_encodings=(),
+    ):
+        """Write the bundle as a new zipfile; return the :py:class:`ZipWriter`
 
-        with closing(bare_zfile) as zfile:
-            self.write_to_zipfile(zfile)
+        If any *sidecar_encodings* are given, the HTML and JSON files also get
+        compressed copies, via a :py:class:`SidecarWriter`, which is returned
+        instead.  The writer is closed, but its ``stats`` are available.
+        """
+        zip_writer = ZipWriter.for_new_file(out_file,
+                                            compression_policy,
+                                            n_zip_threads,
+                                            deterministic)
+        if sidecar_encodings:
+            zip_writer = SidecarWriter(zip_writer, sidecar_encodings)
+        with closing(zip_writer):
+            self.write_to_zipfile(zip_writer)
+        return zip_writer
@@ -35,9 +35,13 @@ import itertools
 import enum
 import colorlog
 from pathlib import Path
-from dataclasses import dataclass
+from dataclasses import dataclass, field, astuple
+from typing import Optional, Tuple
 from cached_property import cached_property
 from .errors import InternalError, TutorialStructureError
+from .build_cache import BuildCache
+from .blob_cache import shared_blob_cache
+from .asset_metadata import mime_type, image_dimensions
 
 logger = colorlog.getLogger(__name__)
 
@@ -51,19 +55,52 @@ TUTORIAL_TEXT_FILE_BASENAME = "tutorial.md"
 SUMMARY_TEXT_FILE_BASENAME = "summary.md"
 
 
+def path_is_in_asset_dir(path_str, asset_dirname):
+    """Whether the git path *path_str* is within the tutorial's *asset_dirname*
+
+    Git paths always use ``/`` as separator, so we can avoid the cost of
+    constructing a ``pathlib.Path``.
+    """
+    path_parts = path_str.split("/", 2)
+    return len(path_parts) > 1 and path_parts[1] == asset_dirname
+
+
+def discard_cached_property_values(obj):
+    """Forget the values of all *obj*'s ``cached_property`` attributes
+
+    They will be re-computed if next used.  The instance's ``__dict__`` is
+    replaced, rather than having entries removed, because a dict does not
+    shrink when entries are removed from it.
+    """
+    cached_names = {name for name, attr in vars(type(obj)).items()
+                    if isinstance(attr, cached_property)}
+    obj.__dict__ = {name: value for name, value in obj.__dict__.items()
+                    if name not in cached_names}
+
+
 ################################################################################
 
 @dataclass
 class Asset:
     """An asset (graphics or sound) used in the tutorial's project
+
+    Holds only the asset's path, the id of its blob, and its size.  The
+    asset's bytes are read from the repository on demand, and can be streamed
+    into a zipfile without holding a copy of them.
     """
 
     path: str
-    data: bytes
+    blob_id: str
+    size: int
+    repo: pygit2.Repository = field(default=None, repr=False, compare=False)
 
     def __str__(self):
         return ('<Asset "{}": {} bytes>'
-                .format(self.path, len(self.data)))
+                .format(self.path, self.size))
+
+    @classmethod
+    def from_blob_id(cls, repo, path, blob_id):
+        return cls(path, str(blob_id), repo[blob_id].size, repo)
 
     @classmethod
     def from_delta(cls, repo, delta):
@@ -72,11 +109,114 @@ class Asset:
         if delta.status != pygit2.GIT_DELTA_ADDED:
             raise InternalError("delta is not of type ADDED")
 
-        return cls(delta.new_file.path, repo[delta.new_file.id].data)
+        return cls.from_blob_id(repo, delta.new_file.path, delta.new_file.id)
+
+    def __getstate__(self):
+        # A Repository cannot be pickled, and in any case an unpickled Asset
+        # might be in a different process; the receiver must re-attach one.
+        state = dict(self.__dict__)
+        state["repo"] = None
+        return state
+
+    @property
+    def data(self):
+        return self.repo[self.blob_id].data
+
+    def write_to_zipfile(self, zip_writer):
+        """Write the asset's bytes via the given :py:class:`ZipWriter`
+
+        We view the blob's content via its buffer interface, so the only copy of
+        the asset's bytes is the one held by libgit2 while we write.
+        """
+        zip_writer.write(self.path, memoryview(self.repo[self.blob_id]))
+
+    def manifest_entry(self):
+        """Dictionary describing this asset, for a rich asset manifest
+
+        The ``hash`` is the blob id, so identifies the asset's content.  Images
+        whose dimensions can be read from their header also have ``width`` and
+        ``height`` entries.
+        """
+        entry = {
+            "path": self.path,
+            "size": self.size,
+            "hash": self.blob_id,
+            "mime_type": mime_type(self.path),
+        }
+        if entry["mime_type"].startswith("image/"):
+            dimensions = image_dimensions(memoryview(self.repo[self.blob_id]))
+            if dimensions is not None:
+                entry["width"], entry["height"] = dimensions
+        return entry
 
     @cached_property
     def is_project_asset(self):
-        return Path(self.path).parts[1] == 'project-assets'
+        return path_is_in_asset_dir(self.path, PROJECT_ASSET_DIRNAME)
+
+
+################################################################################
+
+@dataclass(frozen=True)
+class PatchLine:
+    """One line of a :py:class:`PatchHunk`
+
+    As for ``pygit2.DiffLine``, a line number of ``-1`` means the line is not
+    present in that (old or new) version, and ``origin`` is the one-character
+    code such as ``"+"`` for an added line.
+    """
+
+    old_lineno: int
+    new_lineno: int
+    content: str
+    origin: str = " "
+
+
+@dataclass(frozen=True)
+class PatchHunk:
+    lines: Tuple[PatchLine, ...]
+
+
+@dataclass(frozen=True)
+class CodePatch:
+    """Plain-data form of the patch between two versions of a file
+
+    Has the ``hunks`` and ``line_stats`` of a ``pygit2.Patch``, but is cheap to
+    iterate over, and can be stored in the :py:class:`BuildCache` via
+    :py:meth:`as_json_value` and :py:meth:`from_json_value`.
+    """
+
+    hunks: Tuple[PatchHunk, ...]
+
+    @classmethod
+    def from_blobs(cls, repo, old_blob_id, new_blob_id):
+        patch = repo[old_blob_id].diff(repo[new_blob_id])
+        return cls(tuple(
+            PatchHunk(tuple(
+                PatchLine(line.old_lineno, line.new_lineno, line.content, line.origin)
+                for line in hunk.lines
+            ))
+            for hunk in patch.hunks
+        ))
+
+    def as_json_value(self):
+        return [[[line.old_lineno, line.new_lineno, line.content, line.origin]
+                 for line in hunk.lines]
+                for hunk in self.hunks]
+
+    @classmethod
+    def from_json_value(cls, value):
+        return cls(tuple(
+            PatchHunk(tuple(PatchLine(*fields) for fields in hunk_value))
+            for hunk_value in value
+        ))
+
+    @property
+    def line_stats(self):
+        """Tuple ``(n_context, n_additions, n_deletions)``"""
+        origins = Counter(line.origin
+                          for hunk in self.hunks
+                          for line in hunk.lines)
+        return (origins[" "], origins["+"], origins["-"])
 
 
 ################################################################################
@@ -91,13 +231,115 @@ class AssetsCreditsEntry:
     credit_markdown: str
 
 
+################################################################################
+
+@dataclass(frozen=True)
+class FileDelta:
+    """The change a commit makes to one file, relative to its first parent
+
+    A plain-data summary of a ``pygit2.DiffDelta``, suitable for storing in
+    the :py:class:`BuildCache`.  Object ids are held as hex strings.
+    """
+
+    status: int
+    old_path: str
+    new_path: str
+    old_id: str
+    new_id: str
+
+    @classmethod
+    def from_delta(cls, delta):
+        return cls(delta.status,
+                   delta.old_file.path,
+                   delta.new_file.path,
+                   delta.old_file.id.hex,
+                   delta.new_file.id.hex)
+
+
+@dataclass(frozen=True)
+class DeltasSummary:
+    """Classification of a commit's deltas, made in a single pass over them
+
+    All of :py:class:`ProjectCommit`'s predicates about what a commit changes
+    are answered from this record.
+
+    The ``added_blobs`` are ``(path, blob_id)`` pairs for each added file, and
+    ``modified_blob_pair`` is the ``(old_id, new_id)`` pair of the modified file
+    if the commit's only delta is a modification (otherwise ``None``).
+    """
+
+    class Kind(enum.Enum):
+        SOLE_MODIFY = enum.auto()
+        PROJECT_ASSETS = enum.auto()
+        TUTORIAL_ASSETS = enum.auto()
+        OTHER = enum.auto()
+
+    kind: Kind
+    touched_paths: Tuple[str, ...]
+    added_blobs: Tuple[Tuple[str, str], ...]
+    modified_blob_pair: Optional[Tuple[str, str]]
+    n_project_asset_adds: int
+    n_tutorial_asset_adds: int
+
+    @classmethod
+    def from_file_deltas(cls, file_deltas):
+        touched_paths = []
+        added_blobs = []
+        modified_blob_pair = None
+        n_project_asset_adds = 0
+        n_tutorial_asset_adds = 0
+
+        for delta in file_deltas:
+            touched_paths.append(delta.new_path)
+            if delta.status == pygit2.GIT_DELTA_ADDED:
+                added_blobs.append((delta.new_path, delta.new_id))
+                if path_is_in_asset_dir(delta.new_path, PROJECT_ASSET_DIRNAME):
+                    n_project_asset_adds += 1
+                elif path_is_in_asset_dir(delta.new_path, TUTORIAL_ASSET_DIRNAME):
+                    n_tutorial_asset_adds += 1
+            elif delta.status == pygit2.GIT_DELTA_MODIFIED:
+                modified_blob_pair = (delta.old_id, delta.new_id)
+
+        n_deltas = len(touched_paths)
+        if n_deltas == 1 and modified_blob_pair is not None:
+            kind = cls.Kind.SOLE_MODIFY
+        elif n_deltas and n_project_asset_adds == n_deltas:
+            kind = cls.Kind.PROJECT_ASSETS
+        elif n_deltas and n_tutorial_asset_adds == n_deltas:
+            kind = cls.Kind.TUTORIAL_ASSETS
+        else:
+            kind = cls.Kind.OTHER
+
+        if kind != cls.Kind.SOLE_MODIFY:
+            modified_blob_pair = None
+
+        return cls(kind,
+                   tuple(touched_paths),
+                   tuple(added_blobs),
+                   modified_blob_pair,
+                   n_project_asset_adds,
+                   n_tutorial_asset_adds)
+
+    @property
+    def n_deltas(self):
+        return len(self.touched_paths)
+
+    @property
+    def sole_modified_basename(self):
+        if self.kind != self.Kind.SOLE_MODIFY:
+            return None
+        return self.touched_paths[0].rsplit("/", 1)[-1]
+
+
 ################################################################################
 
 class ProjectCommit:
     """An individual commit within a tutorial's history
 
     Constructed from a ``pygit2.Repository`` and an ``oid``, which can be an
-    SHA1 string.
+    SHA1 string, or an already-looked-up ``pygit2.Commit``.  If a
+    :py:class:`BuildCache` is also given, the commit's deltas against its
+    parent are looked up there rather than re-computed.
 
     Should be one of the following types:
 
@@ -116,14 +358,23 @@ class ProjectCommit:
        Adds one or more files within the ``project-assets`` directory.
     """
 
-    def __init__(self, repo, oid):
+    COMMIT_DELTAS_CACHE_NAMESPACE = "commit-deltas"
+    CODE_PATCHES_CACHE_NAMESPACE = "code-patches"
+
+    def __init__(self, repo, oid_or_commit, build_cache=None):
         self.repo = repo
-        self.commit = repo[oid]
+        self.commit = (oid_or_commit
+                       if isinstance(oid_or_commit, pygit2.Commit)
+                       else repo[oid_or_commit])
         self.oid = self.commit.id
+        self.build_cache = build_cache
 
     def __str__(self):
         return f"<ProjectCommit: {self.short_oid} {self.summary_label}>"
 
+    def discard_cached_values(self):
+        discard_cached_property_values(self)
+
     @cached_property
     def short_oid(self):
         return self.oid.hex[:12]
@@ -147,15 +398,17 @@ class ProjectCommit:
     def tree(self):
         return self.commit.tree
 
-    def text_file_contents(self, path):
+    def blob_id_of_path(self, path):
         try:
-            text_blob = self.tree / path
+            return self.tree[path].id
         except KeyError:
             raise TutorialStructureError(
                 f"file \"{path}\" not found in tree of {self.oid}"
             )
-        else:
-            return text_blob.data.decode("utf-8")
+
+    def text_file_contents(self, path):
+        blob_id = self.blob_id_of_path(path)
+        return shared_blob_cache.text(self.repo, blob_id)
 
     @cached_property
     def message_subject(self):
@@ -190,13 +443,7 @@ class ProjectCommit:
         return bool(re.match(r'\{base\}', self.message_subject))
 
     def modifies_single_file(self, target_basename):
-        try:
-            delta = self.sole_modify_against_parent
-        except TutorialStructureError:
-            return False
-
-        path_of_modified_file = pathlib.Path(delta.old_file.path)
-        return path_of_modified_file.name == target_basename
+        return self.deltas_summary.sole_modified_basename == target_basename
 
     @cached_property
     def diff_against_parent_or_empty(self):
@@ -213,6 +460,35 @@ class ProjectCommit:
         )
         return self.commit.tree.diff_to_tree(*diff_args, swap=True)
 
+    @cached_property
+    def file_deltas_against_parent(self):
+        """List of :py:class:`FileDelta` against parent (or empty tree)
+
+        A commit's deltas can never change, so if we have a build-cache, look
+        there first, and store freshly-computed deltas there.
+        """
+        cache = self.build_cache
+        cache_namespace = self.COMMIT_DELTAS_CACHE_NAMESPACE
+        cache_key = self.oid.hex
+
+        if cache is not None:
+            maybe_cached = cache.get(cache_namespace, cache_key)
+            if maybe_cached is not None:
+                return [FileDelta(*fields) for fields in maybe_cached]
+
+        file_deltas = [FileDelta.from_delta(delta)
+                       for delta in self.diff_against_parent_or_empty.deltas]
+
+        if cache is not None:
+            cache.put(cache_namespace, cache_key,
+                      [astuple(delta) for delta in file_deltas])
+
+        return file_deltas
+
+    @cached_property
+    def deltas_summary(self):
+        return DeltasSummary.from_file_deltas(self.file_deltas_against_parent)
+
     @cached_property
     def modifies_tutorial_text(self):
         return self.modifies_single_file(TUTORIAL_TEXT_FILE_BASENAME)
@@ -223,13 +499,13 @@ class ProjectCommit:
 
     @staticmethod
     def path_is_a_project_asset(path_str):
-        return pathlib.Path(path_str).parts[1] == PROJECT_ASSET_DIRNAME
+        return path_is_in_asset_dir(path_str, PROJECT_ASSET_DIRNAME)
 
     @staticmethod
     def path_is_a_tutorial_asset(path_str):
-        return pathlib.Path(path_str).parts[1] == TUTORIAL_ASSET_DIRNAME
+        return path_is_in_asset_dir(path_str, TUTORIAL_ASSET_DIRNAME)
 
-    def adds_assets(self, is_asset_fun, asset_kind_name):
+    def adds_assets(self, n_deltas_adding_assets, asset_kind_name):
         # Special-case the BASE commit, which can add a whole lot of files in
         # various places in the tree.  Treat it as not adding assets.
         #
@@ -239,40 +515,36 @@ class ProjectCommit:
         if self.is_base:
             return False
 
-        deltas_adding_assets = []
-        other_deltas = []
-
-        for delta in self.diff_against_parent_or_empty.deltas:
-            if (delta.status == pygit2.GIT_DELTA_ADDED
-                    and is_asset_fun(delta.new_file.path)):
-                deltas_adding_assets.append(delta)
-            else:
-                other_deltas.append(delta)
-
-        if deltas_adding_assets and other_deltas:
+        n_deltas = self.deltas_summary.n_deltas
+        if n_deltas_adding_assets and n_deltas_adding_assets != n_deltas:
             raise TutorialStructureError(
                 f"commit {self.oid} adds {asset_kind_name} assets"
                 " but also has other deltas"
             )
 
-        return bool(deltas_adding_assets)
+        return bool(n_deltas_adding_assets)
 
     @cached_property
     def adds_project_assets(self):
-        return self.adds_assets(self.path_is_a_project_asset, "project")
+        n_adds = self.deltas_summary.n_project_asset_adds
+        return self.adds_assets(n_adds, "project")
 
     @cached_property
     def adds_tutorial_assets(self):
-        return self.adds_assets(self.path_is_a_tutorial_asset, "tutorial")
+        n_adds = self.deltas_summary.n_tutorial_asset_adds
+        return self.adds_assets(n_adds, "tutorial")
 
     @cached_property
     def sole_modify_against_parent(self):
-        diff = self.diff_against_parent_or_empty
-        if len(diff) != 1:
+        """The :py:class:`FileDelta` of this commit's only change, which must
+        be a modification
+        """
+        file_deltas = self.file_deltas_against_parent
+        if len(file_deltas) != 1:
             raise TutorialStructureError(
                 f"commit {self.oid} does not have exactly one delta"
             )
-        delta = list(diff.deltas)[0]
+        delta = file_deltas[0]
         if delta.status != pygit2.GIT_DELTA_MODIFIED:
             raise TutorialStructureError(
                 f"commit {self.oid}'s delta is not of type MODIFIED"
@@ -282,8 +554,8 @@ class ProjectCommit:
     @cached_property
     def added_assets(self):
         if self.adds_project_assets or self.adds_tutorial_assets:
-            return [Asset.from_delta(self.repo, delta)
-                    for delta in self.diff_against_parent_or_empty.deltas]
+            return [Asset.from_blob_id(self.repo, path, blob_id)
+                    for path, blob_id in self.deltas_summary.added_blobs]
         else:
             return []
 
@@ -311,45 +583,183 @@ class ProjectCommit:
 
     @cached_property
     def code_patch_against_parent(self):
+        """The :py:class:`CodePatch` this commit makes to the Python code
+
+        The patch depends only on the old and new blobs, so if we have a
+        build-cache, look there first, and store freshly-computed patches there.
+        """
         if not self.modifies_python_code:
             raise TutorialStructureError(
                 f"commit {self.oid} does not modify the Python code"
             )
 
-        delta = self.sole_modify_against_parent
-        old_blob = self.repo[delta.old_file.id]
-        new_blob = self.repo[delta.new_file.id]
-        return old_blob.diff(new_blob)
+        old_blob_id, new_blob_id = self.deltas_summary.modified_blob_pair
+
+        cache = self.build_cache
+        cache_namespace = self.CODE_PATCHES_CACHE_NAMESPACE
+        cache_key = f"{old_blob_id}:{new_blob_id}"
+
+        if cache is not None:
+            maybe_cached = cache.get(cache_namespace, cache_key)
+            if maybe_cached is not None:
+                return CodePatch.from_json_value(maybe_cached)
+
+        patch = CodePatch.from_blobs(self.repo, old_blob_id, new_blob_id)
+
+        if cache is not None:
+            cache.put(cache_namespace, cache_key, patch.as_json_value())
+
+        return patch
 
 
 ################################################################################
 
 class ProjectHistory:
     """Development history of a Pytch project within a tutorial context
+
+    Constructed from either the path to a git repository or an already-open
+    ``pygit2.Repository``.  When building many histories from the one
+    repository (e.g., for a tutorial collection), passing the same open
+    repository, and the same :py:class:`BuildCache`, to each lets them share
+    pack-file mappings, libgit2's object cache, and our cache.
+
+    A long-lived instance can be brought up to date with a new tip via
+    :py:meth:`refresh`.
+
+    If no :py:class:`BuildCache` is given, the history opens the repository's
+    own, and :py:meth:`close` closes it.
     """
 
     class TutorialTextSource(enum.Enum):
         TIP_REVISION = enum.auto()
         WORKING_DIRECTORY = enum.auto()
 
+    # Cached properties whose values depend on which commit is the tip, and so
+    # which must be discarded if the tip moves.
+    TIP_DEPENDENT_PROPERTIES = [
+        "tip_oid_string",
+        "all_assets",
+        "all_project_assets",
+        "all_asset_credits",
+        "top_level_directory_name",
+        "python_code_path",
+        "tutorial_text_path",
+        "summary_text_path",
+        "tip_tutorial_text",
+        "tip_summary_text",
+        "final_code_text",
+        "final_code_blob_id",
+        "commit_from_slug",
+        "ordered_commit_slugs",
+    ]
+
+    # Cached properties whose values depend also on the base commit.
+    BASE_DEPENDENT_PROPERTIES = [
+        "initial_code_text",
+        "initial_code_blob_id",
+    ]
+
     def __init__(
             self,
-            repo_directory,
+            repo_or_directory,
             tip_revision,
             tutorial_text_source=TutorialTextSource.TIP_REVISION,
+            build_cache=None,
     ):
-        self.repo = pygit2.Repository(repo_directory)
+        self.repo = (repo_or_directory
+                     if isinstance(repo_or_directory, pygit2.Repository)
+                     else pygit2.Repository(repo_or_directory))
+        self.owns_build_cache = (build_cache is None)
+        self.build_cache = (build_cache
+                            if build_cache is not None
+                            else BuildCache.for_repository(self.repo))
         self.tutorial_text_source = tutorial_text_source
+        self.working_file_texts = {}
         tip_oid = self.repo.revparse_single(tip_revision).oid
         self.project_commits = self.commit_linear_ancestors(tip_oid)
 
         self.validate_structure()
 
+    def refresh(self, new_tip_revision):
+        """Update this history to have the given new tip
+
+        If the old tip is a first-parent ancestor of the new one, only the
+        commits since the old tip are examined, and only the new commits' slugs
+        are checked for uniqueness.  Otherwise, the history is rebuilt from the
+        new tip down to its ``{base}`` commit.  Either way, cached values which
+        depend on the tip are discarded.  If the new history is not valid, raise
+        ``TutorialStructureError`` and leave this history unchanged.
+
+        Return the number of commits new to this history.
+        """
+        old_tip_oid = self.project_commits[0].oid
+        new_tip_oid = self.repo.revparse_single(new_tip_revision).oid
+        if new_tip_oid == old_tip_oid:
+            return 0
+
+        new_commits = self.commit_linear_ancestors(new_tip_oid, old_tip_oid)
+
+        if new_commits[-1].oid == old_tip_oid:
+            new_commits.pop()
+            self.validate_new_slugs_unique(new_commits)
+            self.project_commits = new_commits + self.project_commits
+            self.invalidate_cached_properties(self.TIP_DEPENDENT_PROPERTIES)
+        else:
+            old_project_commits = self.project_commits
+            self.project_commits = new_commits
+            self.invalidate_cached_properties(self.TIP_DEPENDENT_PROPERTIES)
+            try:
+                self.validate_structure()
+            except TutorialStructureError:
+                self.project_commits = old_project_commits
+                self.invalidate_cached_properties(self.TIP_DEPENDENT_PROPERTIES)
+                raise
+            self.invalidate_cached_properties(self.BASE_DEPENDENT_PROPERTIES)
+
+        logger.debug(f"refreshed history to {new_tip_oid}:"
+                     f" {len(new_commits)} new commit/s")
+        return len(new_commits)
+
+    def invalidate_cached_properties(self, property_names):
+        for name in property_names:
+            self.__dict__.pop(name, None)
+
+    def close(self):
+        """Close the build-cache, if this history opened it"""
+        if self.owns_build_cache:
+            self.build_cache.close()
+
+    def discard_cached_values(self):
+        """Free memory held by cached values of this history and its commits
+
+        Useful once a bundle has been built from this history, if the history
+        is to be kept for other purposes.  The values will be re-computed (or
+        fetched from the build-cache) if needed again.
+        """
+        discard_cached_property_values(self)
+        self.working_file_texts.clear()
+        for project_commit in self.project_commits:
+            project_commit.discard_cached_values()
+
     def validate_structure(self):
         self.validate_slug_uniqueness()
 
     def validate_slug_uniqueness(self):
-        occurrences_of_slug = Counter(self.ordered_commit_slugs)
+        self.raise_if_repeated_slugs(self.ordered_commit_slugs)
+
+    def validate_new_slugs_unique(self, new_commits):
+        """Check slugs of *new_commits* are unique, including against ours
+
+        The *new_commits* should be newest first, like ``project_commits``.
+        """
+        new_slugs = [pc.identifier_slug
+                     for pc in reversed(new_commits)
+                     if pc.has_identifier_slug]
+        self.raise_if_repeated_slugs(self.ordered_commit_slugs + new_slugs)
+
+    @staticmethod
+    def raise_if_repeated_slugs(slugs):
+        occurrences_of_slug = Counter(slugs)
         repeated_slugs = [
             slug
             for slug, n_occurrences in occurrences_of_slug.items()
@@ -360,18 +770,30 @@ class ProjectHistory:
                 f"duplicate commit-identifier slug/s {repeated_slugs}"
             )
 
-    def commit_linear_ancestors(self, tip_oid):
-        project_commits = [ProjectCommit(self.repo, tip_oid)]
-        while not project_commits[-1].is_base:
-            # TODO: Handle merges (more than one parent).
-            parent_ids = project_commits[-1].commit.parent_ids
-            if not parent_ids:
-                raise TutorialStructureError(
-                    f"did not find {{base}} commit in ancestors of {tip_oid}"
-                )
-            oid = parent_ids[0]
-            project_commits.append(ProjectCommit(self.repo, oid))
-        return project_commits
+    def commit_linear_ancestors(self, tip_oid, stop_oid=None):
+        """List of commits from *tip_oid* back to the ``{base}`` commit
+
+        If *stop_oid* is given and is met before the ``{base}`` commit, stop
+        there instead (including the *stop_oid* commit as the last element).
+
+        The chain is found by one native libgit2 revision-walk, restricted to
+        first parents (so following only the main line through any merges).
+        Each :py:class:`ProjectCommit` wraps the ``pygit2.Commit`` the walk
+        yields; its content is only examined if asked for.
+        """
+        walker = self.repo.walk(tip_oid, pygit2.GIT_SORT_NONE)
+        walker.simplify_first_parent()
+
+        project_commits = []
+        for commit in walker:
+            project_commit = ProjectCommit(self.repo, commit, self.build_cache)
+            project_commits.append(project_commit)
+            if project_commit.is_base or commit.id == stop_oid:
+                return project_commits
+
+        raise TutorialStructureError(
+            f"did not find {{base}} commit in ancestors of {tip_oid}"
+        )
 
     @cached_property
     def tip_oid_string(self):
@@ -437,7 +859,7 @@ class ProjectHistory:
         dirname = self.top_level_directory_name
         return f"{dirname}/{SUMMARY_TEXT_FILE_BASENAME}"
 
-    @cached_property
+    @property
     def tutorial_text(self):
         """The final tutorial text, depending on ``tutorial_text_source``
 
@@ -453,30 +875,54 @@ class ProjectHistory:
 
         In the example, the contents of the file ``bunner/tutorial.md``, either
         as of the tip commit from which the :py:class:`ProjectHistory` was
-        constructed, or as currently in the repo's working directory.
+        constructed (or last refreshed), or as currently in the repo's working
+        directory.  In the latter case, the file is only re-read if its
+        modification time or size has changed since we last read it.
         """
         if self.tutorial_text_source == self.TutorialTextSource.TIP_REVISION:
-            tip_commit = self.project_commits[0]
-            return tip_commit.text_file_contents(self.tutorial_text_path)
+            return self.tip_tutorial_text
         elif self.tutorial_text_source == self.TutorialTextSource.WORKING_DIRECTORY:
-            full_path = self.workdir_path / self.tutorial_text_path
-            with full_path.open("rt") as f_in:
-                return f_in.read()
+            return self.working_file_text(self.tutorial_text_path)
         else:
             raise InternalError("unknown tutorial_text_source")
 
-    @cached_property
+    @property
     def summary_text(self):
         if self.tutorial_text_source == self.TutorialTextSource.TIP_REVISION:
-            tip_commit = self.project_commits[0]
-            return tip_commit.text_file_contents(self.summary_text_path)
+            return self.tip_summary_text
         elif self.tutorial_text_source == self.TutorialTextSource.WORKING_DIRECTORY:
-            full_path = self.workdir_path / self.summary_text_path
-            with full_path.open("rt") as f_in:
-                return f_in.read()
+            return self.working_file_text(self.summary_text_path)
         else:
             raise InternalError("unknown tutorial_text_source")
 
+    @cached_property
+    def tip_tutorial_text(self):
+        tip_commit = self.project_commits[0]
+        return tip_commit.text_file_contents(self.tutorial_text_path)
+
+    @cached_property
+    def tip_summary_text(self):
+        tip_commit = self.project_commits[0]
+        return tip_commit.text_file_contents(self.summary_text_path)
+
+    def working_file_text(self, path):
+        """Contents of the file at *path* in the working directory
+
+        Cached, but re-read if the file's modification time or size changes.
+        """
+        full_path = self.workdir_path / path
+        file_stat = full_path.stat()
+        stamp = (file_stat.st_mtime_ns, file_stat.st_size)
+
+        maybe_cached = self.working_file_texts.get(path)
+        if maybe_cached is not None and maybe_cached[0] == stamp:
+            return maybe_cached[1]
+
+        with full_path.open("rt") as f_in:
+            text = f_in.read()
+        self.working_file_texts[path] = (stamp, text)
+        return text
+
     @cached_property
     def initial_code_text(self):
         """The initial Python code
@@ -498,6 +944,21 @@ class ProjectHistory:
         tip_commit = self.project_commits[0]
         return tip_commit.text_file_contents(self.python_code_path)
 
+    @cached_property
+    def initial_code_blob_id(self):
+        """The id of the blob holding :py:attr:`initial_code_text`"""
+        base_commit = self.project_commits[-1]
+        return base_commit.blob_id_of_path(self.python_code_path)
+
+    @cached_property
+    def final_code_blob_id(self):
+        """The id of the blob holding :py:attr:`final_code_text`"""
+        tip_commit = self.project_commits[0]
+        return tip_commit.blob_id_of_path(self.python_code_path)
+
+    def code_text_from_blob_id(self, blob_id):
+        return shared_blob_cache.text(self.repo, blob_id)
+
     @cached_property
     def commit_from_slug(self):
         return {
@@ -529,6 +990,13 @@ class ProjectHistory:
         commit = self.commit_from_slug[slug]
         return commit.text_file_contents(self.python_code_path)
 
+    def code_blob_id_from_slug(self, slug):
+        """The id of the blob holding ``code.py`` as of the commit tagged with
+        the given *slug*
+        """
+        commit = self.commit_from_slug[slug]
+        return commit.blob_id_of_path(self.python_code_path)
+
     def code_patch_against_parent(self, slug):
         commit = self.commit_from_slug[slug]
         return commit.code_patch_against_parent
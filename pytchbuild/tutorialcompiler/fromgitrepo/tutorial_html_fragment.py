@@ -8,12 +8,16 @@ just stacking two tables?
 
 import re
 import bs4
+import hashlib
 import difflib
+import itertools
 import colorlog
+from collections import OrderedDict
 
 from .tutorial_markdown import (
     soup_from_markdown_text,
     ordered_commit_slugs_in_soup,
+    rendering_versions,
 )
 
 from .errors import InternalError, TutorialStructureError
@@ -27,60 +31,70 @@ def line_classification(hunk_line):
             else "diff-unch")
 
 
-def table_data_from_line_number(soup, lineno):
-    cell = soup.new_tag("td", attrs={"class": "linenum"})
-    if lineno != -1:
-        lineno_pre = soup.new_tag("pre")
-        lineno_pre.append(str(lineno))
-        cell.append(lineno_pre)
-    return cell
+class RawHtml(bs4.element.PreformattedString):
+    """Already-rendered HTML, output as-is when the soup holding it is rendered
+    """
+    PREFIX = ""
+    SUFFIX = ""
 
 
-def table_row_from_line(soup, line):
-    row = soup.new_tag("tr")
-    content_cell = soup.new_tag("td")
-    content_pre = soup.new_tag("pre")
+# The formatter used when rendering a soup with str(), which we use to escape
+# text and attribute values in exactly the same way.
+HTML_FORMATTER = bs4.formatter.HTMLFormatter.REGISTRY["minimal"]
 
-    row.append(table_data_from_line_number(soup, line.old_lineno))
-    row.append(table_data_from_line_number(soup, line.new_lineno))
 
-    content_pre.append(line.content.rstrip("\n"))
-    content_cell.append(content_pre)
-    row.append(content_cell)
+def html_escaped(text):
+    return HTML_FORMATTER.substitute(text)
 
-    return row
 
+def html_attribute(name, value):
+    quoted_value = HTML_FORMATTER.quoted_attribute_value(
+        HTML_FORMATTER.attribute_value(value)
+    )
+    return f" {name}={quoted_value}"
 
-def table_from_hunk(soup, hunk):
-    prev_class = None
-    running_tbody = None
-    tbody_elts = []
 
-    for line in hunk.lines:
-        line_class = line_classification(line)
-        if line_class != prev_class:
-            tbody_elts.append(running_tbody)
-            running_tbody = soup.new_tag("tbody", attrs={"class": line_class})
-            if line_class == "diff-add":
-                running_tbody["data-added-text"] = ""
+# Patch tables are rendered directly to strings, escaped and with attributes
+# ordered just as bs4 would render them, rather than built as soup elements.
+# Building an element for every cell of every diff line would take most of
+# the time when compiling a tutorial.
 
-        prev_class = line_class
+def html_from_line_number(lineno):
+    if lineno == -1:
+        return '<td class="linenum"></td>'
+    return f'<td class="linenum"><pre>{lineno}</pre></td>'
 
-        running_tbody.append(table_row_from_line(soup, line))
-        if line_class == "diff-add":
-            running_tbody["data-added-text"] += line.content
 
-    table = soup.new_tag("table")
-    for tbody in tbody_elts[1:] + [running_tbody]:
-        table.append(tbody)
+def html_from_line(line):
+    return "".join([
+        "<tr>",
+        html_from_line_number(line.old_lineno),
+        html_from_line_number(line.new_lineno),
+        "<td><pre>",
+        html_escaped(line.content.rstrip("\n")),
+        "</pre></td></tr>",
+    ])
 
-    return table
+
+def html_from_hunk(hunk):
+    # Attributes are in alphabetical order, as rendered by bs4.
+    pieces = ["<table>"]
+    for line_class, lines in itertools.groupby(hunk.lines, line_classification):
+        lines = list(lines)
+        tbody_attributes = html_attribute("class", line_class)
+        if line_class == "diff-add":
+            added_text = "".join(line.content for line in lines)
+            tbody_attributes += html_attribute("data-added-text", added_text)
+        pieces.append(f"<tbody{tbody_attributes}>")
+        pieces.extend(html_from_line(line) for line in lines)
+        pieces.append("</tbody>")
+    pieces.append("</table>")
+    return "".join(pieces)
 
 
 def tables_div_from_patch(soup, patch):
     div = soup.new_tag("div", attrs={"class": "patch"})
-    for hunk in patch.hunks:
-        div.append(table_from_hunk(soup, hunk))
+    div.append(RawHtml("".join(html_from_hunk(hunk) for hunk in patch.hunks)))
     return div
 
 
@@ -103,8 +117,11 @@ def div_from_front_matter(
         final_code_text
 ):
     div = div_from_elements(soup, "front-matter", front_matter)
-    div["data-initial-code-text"] = initial_code_text
-    div["data-complete-code-text"] = final_code_text
+    # The code texts are None when the code is in a separate snapshot store.
+    if initial_code_text is not None:
+        div["data-initial-code-text"] = initial_code_text
+    if final_code_text is not None:
+        div["data-complete-code-text"] = final_code_text
 
     if maybe_seek_to_chapter is not None:
         div["data-seek-to-chapter"] = str(maybe_seek_to_chapter)
@@ -141,11 +158,29 @@ def node_is_asset_credits_marker(elt):
             and "asset-credits" in elt.attrs["class"])
 
 
-def augment_patch_elt(soup, elt, project_history):
+def code_snapshot_key(code_snapshots, project_history, blob_id):
+    """The key, in *code_snapshots*, of the code in the given blob
+
+    The key is the blob's id.  The code is added to *code_snapshots* if not
+    already there.
+    """
+    key = str(blob_id)
+    if key not in code_snapshots:
+        code_snapshots[key] = project_history.code_text_from_blob_id(blob_id)
+    return key
+
+
+def augment_patch_elt(soup, elt, project_history, code_snapshots=None):
     target_slug = elt.attrs["data-slug"]
     if project_history.slug_is_known(target_slug):
-        code_text = project_history.code_text_from_slug(target_slug)
-        elt.attrs["data-code-as-of-commit"] = code_text
+        if code_snapshots is None:
+            code_text = project_history.code_text_from_slug(target_slug)
+            elt.attrs["data-code-as-of-commit"] = code_text
+        else:
+            blob_id = project_history.code_blob_id_from_slug(target_slug)
+            elt.attrs["data-code-as-of-commit-oid"] = code_snapshot_key(
+                code_snapshots, project_history, blob_id
+            )
         patch = project_history.code_patch_against_parent(target_slug)
         elt.append(tables_div_from_patch(soup, patch))
     else:
@@ -157,6 +192,63 @@ def augment_patch_elt(soup, elt, project_history):
         elt.append(warning_p)
 
 
+CREDITS_CACHE_NAMESPACE = "credits-html"
+CREDITS_CACHE_MAX_N_ENTRIES = 4096
+
+# The same credit (e.g., a licence and source) is often given for many assets,
+# across many tutorials, so rendered credits are memoised, keyed by a hash of
+# their Markdown and the versions of the software rendering it.  As a
+# long-running process (e.g., pytchbuild-watch) might render any number of
+# credits, only the CREDITS_CACHE_MAX_N_ENTRIES most recently used are kept.
+credit_html_from_key = OrderedDict()
+
+
+def credit_html_cache_key(credit_markdown):
+    key_parts = rendering_versions() + [credit_markdown]
+    key_hash = hashlib.sha256()
+    for part in key_parts:
+        key_hash.update(part.encode("utf-8"))
+        key_hash.update(b"\0")
+    return key_hash.hexdigest()
+
+
+def rendered_credit_html(credit_markdown):
+    credits_soup = soup_from_markdown_text(credit_markdown)
+    credit_body_elt = credits_soup.new_tag("div")
+    for credit_elt in credits_soup.children:
+        credit_body_elt.append(credit_elt)
+    html = credit_body_elt.decode_contents()
+    credits_soup.decompose()
+    return html
+
+
+def credit_html(credit_markdown, build_cache=None):
+    """The HTML rendering of the given credit's Markdown
+
+    Looked up in memory, then in *build_cache* if given, before rendering it
+    and storing the result in both.
+    """
+    cache_key = credit_html_cache_key(credit_markdown)
+
+    html = credit_html_from_key.get(cache_key)
+    if html is not None:
+        credit_html_from_key.move_to_end(cache_key)
+        return html
+
+    if build_cache is not None:
+        html = build_cache.get(CREDITS_CACHE_NAMESPACE, cache_key)
+    if html is None:
+        html = rendered_credit_html(credit_markdown)
+        if build_cache is not None:
+            build_cache.put(CREDITS_CACHE_NAMESPACE, cache_key, html,
+                            CREDITS_CACHE_MAX_N_ENTRIES)
+
+    credit_html_from_key[cache_key] = html
+    while len(credit_html_from_key) > CREDITS_CACHE_MAX_N_ENTRIES:
+        credit_html_from_key.popitem(last=False)
+    return html
+
+
 def augment_asset_credits_elt(soup, elt, project_history):
     for credit in project_history.all_asset_credits:
         credit_intro_elt = soup.new_tag("p", attrs={"class": "credit-intro"})
@@ -174,10 +266,10 @@ def augment_asset_credits_elt(soup, elt, project_history):
         elt.append(credit_intro_elt)
 
         credit_body_elt = soup.new_tag("div", attrs={"class": "credits"})
-
-        credits_soup = soup_from_markdown_text(credit.credit_markdown)
-        for credit_elt in credits_soup.children:
-            credit_body_elt.append(credit_elt)
+        credit_body_elt.append(RawHtml(credit_html(
+            credit.credit_markdown,
+            project_history.build_cache,
+        )))
 
         elt.append(credit_body_elt)
 
@@ -202,7 +294,29 @@ def warn_if_slug_usage_mismatch(project_history, soup):
             logger.warning("    " + diff_item)
 
 
-def tutorial_div_from_project_history(project_history):
+def tutorial_div_from_project_history(project_history, code_snapshots=None):
+    """The ``<div>`` holding the whole tutorial
+
+    See :py:func:`tutorial_div_and_n_chapters_from_project_history`.
+    """
+    tutorial_div, _ = tutorial_div_and_n_chapters_from_project_history(
+        project_history, code_snapshots
+    )
+    return tutorial_div
+
+
+def tutorial_div_and_n_chapters_from_project_history(
+        project_history,
+        code_snapshots=None,
+):
+    """The ``<div>`` holding the whole tutorial, and its number of chapters
+
+    By default, the Python code as of each patch, and the initial and final
+    code, are held in attributes of the patch and front-matter elements.  If
+    a dict *code_snapshots* is given, each distinct version of the code is
+    instead added to it, keyed by its blob id, and the elements' attributes
+    (suffixed ``-oid``) give just the keys.
+    """
     soup = soup_from_markdown_text(project_history.tutorial_text)
     warn_if_slug_usage_mismatch(project_history, soup)
 
@@ -244,7 +358,7 @@ def tutorial_div_from_project_history(project_history):
             maybe_wip_chapter_idx = chapter_idx
         else:
             if node_is_patch(elt):
-                augment_patch_elt(soup, elt, project_history)
+                augment_patch_elt(soup, elt, project_history, code_snapshots)
             elif elt.name == "h2":
                 chapters.append(current_chapter)
                 current_chapter = []
@@ -259,20 +373,32 @@ def tutorial_div_from_project_history(project_history):
         "data-tip-sha1": project_history.tip_oid_string,
     })
 
-    tutorial_div.append(div_from_front_matter(
-        soup,
-        front_matter,
-        maybe_wip_chapter_idx,
-        project_history.initial_code_text,
-        project_history.final_code_text
-    ))
+    if code_snapshots is None:
+        tutorial_div.append(div_from_front_matter(
+            soup,
+            front_matter,
+            maybe_wip_chapter_idx,
+            project_history.initial_code_text,
+            project_history.final_code_text
+        ))
+    else:
+        front_matter_div = div_from_front_matter(
+            soup, front_matter, maybe_wip_chapter_idx, None, None
+        )
+        front_matter_div["data-initial-code-oid"] = code_snapshot_key(
+            code_snapshots, project_history, project_history.initial_code_blob_id
+        )
+        front_matter_div["data-complete-code-oid"] = code_snapshot_key(
+            code_snapshots, project_history, project_history.final_code_blob_id
+        )
+        tutorial_div.append(front_matter_div)
 
     # Skip the first 'chapter'; it should be empty because the main content
     # should start with a <H2>.  TODO: Check this.
     for chapter in chapters[1:]:
         tutorial_div.append(div_from_chapter(soup, chapter))
 
-    return tutorial_div
+    return tutorial_div, len(chapters) - 1
 
 
 def summary_div_from_project_history(project_history):
@@ -1,15 +1,28 @@
+import os
 import re
+import hashlib
+import threading
+from pathlib import Path
 import xml.etree.ElementTree as etree
 import markdown
+import bs4
 from bs4 import BeautifulSoup
+import colorlog
 
+from ... import __version__ as pytchbuild_version
 from .errors import TutorialStructureError
 
 
+logger = colorlog.getLogger(__name__)
+
+
 class ShortcodeProcessor(markdown.blockprocessors.BlockProcessor):
     RE_SHORTCODE = re.compile(r"^\s*\{\{< ([-\w]+)( (.*))? >\}\}\s*$")
 
     def test(self, parent, block):
+        # Cheap check first; most blocks are not shortcodes.
+        if not block.lstrip().startswith("{{<"):
+            return False
         m = self.RE_SHORTCODE.match(block)
         return (m is not None)
 
@@ -47,12 +60,121 @@ class ShortcodeExtension(markdown.extensions.Extension):
         )
 
 
-def soup_from_markdown_text(markdown_text):
-    html = markdown.markdown(markdown_text, extensions=[ShortcodeExtension()])
-    soup = BeautifulSoup(html, "html.parser")
+HTML_PARSER_ENV_VAR = "PYTCHBUILD_HTML_PARSER"
+FALLBACK_HTML_PARSER = "html.parser"
+
+
+def default_html_parser():
+    """Name of the BeautifulSoup parser to use for Markdown's output
+
+    The parser named by the environment variable ``PYTCHBUILD_HTML_PARSER``,
+    e.g., ``"lxml"``, if set and available; otherwise ``"html.parser"``.  With
+    current versions of BeautifulSoup, building the soup costs more than
+    parsing, and ``"html.parser"`` is in fact the faster, so is the default.
+    """
+    requested_parser = os.environ.get(HTML_PARSER_ENV_VAR)
+    if not requested_parser:
+        return FALLBACK_HTML_PARSER
+    if bs4.builder.builder_registry.lookup(requested_parser) is None:
+        logger.warning(f"HTML parser \"{requested_parser}\" not available;"
+                       f" using \"{FALLBACK_HTML_PARSER}\"")
+        return FALLBACK_HTML_PARSER
+    return requested_parser
+
+
+# Chosen once per process, so all tutorials are built the same way.
+HTML_PARSER = default_html_parser()
+
+
+def html_parser_description():
+    """Name, and version if not built in, of the parser in use
+
+    Part of the key under which a bundle is cached, since different parsers
+    could in principle give different output.
+    """
+    if HTML_PARSER == "lxml":
+        import lxml
+        return f"lxml {lxml.__version__}"
+    return HTML_PARSER
+
+
+def rendering_code_digest():
+    """Hash of the source of the modules which build a tutorial
+
+    The version number of ``pytchbuild`` does not change with every change to
+    the code, so the code itself is part of the keys under which rendered HTML
+    is cached.
+    """
+    code_hash = hashlib.sha256()
+    for module_path in sorted(Path(__file__).parent.glob("*.py")):
+        code_hash.update(module_path.name.encode("utf-8"))
+        code_hash.update(b"\0")
+        code_hash.update(module_path.read_bytes())
+    return code_hash.hexdigest()
+
+
+RENDERING_CODE_DIGEST = rendering_code_digest()
+
+
+def rendering_versions():
+    """Versions of the software which turns Markdown into HTML
+
+    For the keys under which rendered HTML is cached, so that upgrading any of
+    them, or changing our own code, means re-rendering.
+    """
+    return [
+        pytchbuild_version,
+        RENDERING_CODE_DIGEST,
+        markdown.__version__,
+        bs4.__version__,
+        html_parser_description(),
+    ]
+
+
+def soup_from_html_fragment(html, parser=None):
+    """Parse *html* into a soup whose top-level children are the fragment's
+
+    Parsers other than ``"html.parser"`` wrap a fragment in ``<html><body>``
+    (and maybe add a ``<head>``), which we remove, to give the same soup as
+    ``"html.parser"`` does.
+    """
+    if parser is None:
+        parser = HTML_PARSER
+    soup = BeautifulSoup(html, parser)
+    if parser != FALLBACK_HTML_PARSER:
+        for wrapper_name in ["html", "body"]:
+            wrapper = soup.find(wrapper_name, recursive=False)
+            if wrapper is not None:
+                wrapper.unwrap()
+        head = soup.find("head", recursive=False)
+        if head is not None and not head.contents:
+            head.decompose()
     return soup
 
 
+# Setting up a Markdown instance, with its many processors and patterns, costs
+# more than converting a typical short text (e.g., an asset credit), so each
+# thread keeps one instance, resetting it before each use.
+markdown_engine_state = threading.local()
+
+
+def markdown_engine():
+    """This thread's ``Markdown`` instance, with our extension, reset"""
+    engine = getattr(markdown_engine_state, "engine", None)
+    if engine is None:
+        engine = markdown.Markdown(extensions=[ShortcodeExtension()])
+        markdown_engine_state.engine = engine
+    return engine.reset()
+
+
+def html_from_markdown_text(markdown_text):
+    return markdown_engine().convert(markdown_text)
+
+
+def soup_from_markdown_text(markdown_text):
+    return soup_from_html_fragment(html_from_markdown_text(markdown_text))
+
+
 def ordered_commit_slugs_in_soup(soup):
     return [elt.attrs["data-slug"]
             for elt in soup.find_all("div",
@@ -0,0 +1,316 @@
+"""Writing of zipfiles, choosing how to compress each member
+
+Deflating a file which is already compressed (e.g., a PNG or MP3 asset)
+costs time and saves nothing, so a :py:class:`CompressionPolicy` decides, by
+the member's extension and if need be by trying to compress a sample of it,
+which members to store as they are.  A :py:class:`ZipWriter` applies such a
+policy, and keeps statistics of what it wrote.
+
+Deflating is the costly part of writing a zipfile, and zlib releases the GIL
+while it works, so a :py:class:`ZipWriter` can compress members in a pool of
+threads, appending each one, already compressed, to the zipfile in the order
+it was written.  Appending an already-compressed member relies on internals of
+the ``zipfile`` module (unchanged from Python 3.7 to 3.13); if they are not
+present, members are compressed on the calling thread instead.
+"""
+
+from dataclasses import dataclass
+from pathlib import PurePosixPath
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+import zipfile
+import time
+import zlib
+import colorlog
+
+logger = colorlog.getLogger(__name__)
+
+
+DEFAULT_DEFLATE_LEVEL = 6  # Same as zlib's default
+
+
+# The non-public attributes of ZipFile and ZipInfo which
+# ZipWriter.append_compressed_member() uses.
+ZIPFILE_INTERNALS = ("_lock", "_writecheck", "_didModify", "start_dir", "_seekable", "fp")
+ZIPINFO_INTERNALS = ("FileHeader",)
+
+
+def zipfile_supports_appending_compressed(zfile):
+    """Whether *zfile*, and ``zipfile.ZipInfo``, have the internals we need to
+    append already-compressed members
+    """
+    return (all(hasattr(zfile, name) for name in ZIPFILE_INTERNALS)
+            and all(hasattr(zipfile.ZipInfo, name) for name in ZIPINFO_INTERNALS))
+
+
+# Python 3.13 made public the compression level of a ZipInfo, which before was
+# only held in "_compresslevel".
+ZIPINFO_COMPRESS_LEVEL_NAME = ("compress_level"
+                               if hasattr(zipfile.ZipInfo, "compress_level")
+                               else "_compresslevel")
+
+
+def prefixed_path(path_prefix, path):
+    """The *path* within the directory *path_prefix*, which can be empty"""
+    path_prefix = path_prefix.strip("/")
+    return f"{path_prefix}/{path}" if path_prefix else path
+
+
+class CompressionPolicy:
+    """Decide how to compress each member of a zipfile
+
+    Every member is put in one of three categories:
+
+    ``"stored"``
+       Data which is already compressed, recognised by its extension, or
+       because a sample of its content does not shrink usefully when
+       deflated.  Written as-is.
+
+    ``"text"``
+       HTML, JSON, and other text.  Deflated at *text_deflate_level*.
+
+    ``"other"``
+       Everything else.  Deflated at *other_deflate_level*.
+    """
+
+    STORED_SUFFIXES = frozenset([
+        ".png", ".jpg", ".jpeg", ".gif", ".webp",
+        ".mp3", ".ogg", ".oga", ".m4a", ".aac", ".opus",
+        ".mp4", ".webm",
+        ".zip", ".gz", ".bz2", ".xz", ".woff", ".woff2",
+    ])
+
+    TEXT_SUFFIXES = frozenset([
+        ".html", ".json", ".md", ".txt", ".py", ".js", ".css", ".svg", ".yaml",
+    ])
+
+    # Only data at least this long is worth probing; the sample tried is at
+    # most PROBE_SAMPLE_SIZE bytes, and must deflate to at most
+    # PROBE_MAX_RATIO of its size for the data to be deflated.
+    PROBE_MIN_SIZE = 1 << 12
+    PROBE_SAMPLE_SIZE = 1 << 16
+    PROBE_MAX_RATIO = 0.95
+
+    def __init__(
+            self,
+            text_deflate_level=DEFAULT_DEFLATE_LEVEL,
+            other_deflate_level=DEFAULT_DEFLATE_LEVEL,
+    ):
+        self.text_deflate_level = text_deflate_level
+        self.other_deflate_level = other_deflate_level
+
+    def category(self, path, data):
+        suffix = PurePosixPath(path).suffix.lower()
+        if suffix in self.STORED_SUFFIXES:
+            return "stored"
+        if suffix in self.TEXT_SUFFIXES:
+            return "text"
+        if len(data) >= self.PROBE_MIN_SIZE and not self.sample_deflates(data):
+            return "stored"
+        return "other"
+
+    def sample_deflates(self, data):
+        sample = data[:self.PROBE_SAMPLE_SIZE]
+        n_deflated_bytes = len(zlib.compress(sample, 1))
+        return n_deflated_bytes <= self.PROBE_MAX_RATIO * len(sample)
+
+    def compression(self, category):
+        """The ``(compress_type, compress_level)`` for the given category"""
+        if category == "stored":
+            return zipfile.ZIP_STORED, None
+        if category == "text":
+            return zipfile.ZIP_DEFLATED, self.text_deflate_level
+        return zipfile.ZIP_DEFLATED, self.other_deflate_level
+
+
+@dataclass
+class CategoryStats:
+    n_members: int = 0
+    n_bytes_in: int = 0
+    n_bytes_out: int = 0
+    seconds: float = 0.0
+
+    def __str__(self):
+        return (f"{self.n_members} member/s,"
+                f" {self.n_bytes_in} bytes in,"
+                f" {self.n_bytes_out} bytes out,"
+                f" {self.seconds:.3f}s")
+
+
+class ZipWriter:
+    """Write members to an open ``zipfile.ZipFile`` according to a policy
+
+    Statistics of the members written, by category, are accumulated in
+    ``stats``.  Use :py:meth:`for_new_file` to create a writer owning a new
+    zipfile, in which case :py:meth:`close` closes that zipfile.
+
+    If *n_threads* is more than one, members are compressed in a pool of that
+    many threads, and appended to the zipfile as they become ready, in the
+    order they were written.  Call :py:meth:`flush` (or :py:meth:`close`) to
+    make sure all written members are in the zipfile.  The result is the same
+    as when compressing on the calling thread, which is done instead if this
+    version of ``zipfile`` lacks the internals needed; see
+    :py:func:`zipfile_supports_appending_compressed`.
+
+    If *deterministic* is true, every member gets the same timestamp,
+    permissions, and creating system, so that writing the same members, in
+    the same order, with the same policy, always gives the same bytes.
+
+    Every member's path is put within the directory *path_prefix*, if given.
+    """
+
+    STREAM_CHUNK_SIZE = 1 << 20
+
+    # The earliest time a zipfile can represent.
+    DETERMINISTIC_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+    # Number of members, per thread, which can be waiting to be appended.
+    # Each waiting member holds its compressed data in memory.
+    MAX_PENDING_PER_THREAD = 4
+
+    def __init__(
+            self,
+            zfile,
+            policy=None,
+            n_threads=1,
+            deterministic=False,
+            path_prefix="",
+    ):
+        self.zfile = zfile
+        self.policy = policy if policy is not None else CompressionPolicy()
+        self.deterministic = deterministic
+        self.path_prefix = path_prefix
+        self.stats = {}
+        if n_threads > 1 and not zipfile_supports_appending_compressed(zfile):
+            logger.warning("zipfile module lacks internals needed to compress"
+                           " in threads; compressing on one thread")
+            n_threads = 1
+        if n_threads > 1:
+            self.executor = ThreadPoolExecutor(max_workers=n_threads)
+            self.max_n_pending = n_threads * self.MAX_PENDING_PER_THREAD
+            self.pending_members = deque()
+        else:
+            self.executor = None
+
+    @classmethod
+    def for_new_file(cls, out_file, *args, **kwargs):
+        """Create a writer, owning a new zipfile written to *out_file*
+
+        Other arguments are as for the constructor.
+        """
+        return cls(zipfile.ZipFile(out_file, mode="w"), *args, **kwargs)
+
+    def close(self):
+        self.flush()
+        if self.executor is not None:
+            self.executor.shutdown()
+        self.zfile.close()
+
+    def new_zipinfo(self, path, data, category):
+        compress_type, compress_level = self.policy.compression(category)
+        path = prefixed_path(self.path_prefix, path)
+        if self.deterministic:
+            zinfo = zipfile.ZipInfo(path, self.DETERMINISTIC_DATE_TIME)
+            zinfo.external_attr = 0o644 << 16
+            zinfo.create_system = 3  # Unix, whatever platform we are on
+        else:
+            zinfo = zipfile.ZipInfo(path, time.localtime(time.time())[:6])
+            zinfo.external_attr = 0o600 << 16
+        zinfo.compress_type = compress_type
+        # Set in the same way as ZipFile.writestr() does:
+        setattr(zinfo, ZIPINFO_COMPRESS_LEVEL_NAME, compress_level)
+        zinfo.file_size = len(data)
+        return zinfo
+
+    def write(self, path, data):
+        """Write *data*, which can be ``bytes`` or a ``memoryview``, as *path*
+
+        When compressing on the calling thread, the data is passed to the
+        compressor in chunks, so that a large ``memoryview`` (e.g., of a git
+        blob) is not copied all at once.
+        """
+        if self.executor is None:
+            self.write_streamed(path, data)
+        else:
+            future = self.executor.submit(self.compressed_member, path, data)
+            self.pending_members.append(future)
+            while len(self.pending_members) > self.max_n_pending:
+                self.append_next_pending_member()
+
+    def flush(self):
+        if self.executor is not None:
+            while self.pending_members:
+                self.append_next_pending_member()
+
+    def write_streamed(self, path, data):
+        t0 = time.perf_counter()
+        category = self.policy.category(path, data)
+        zinfo = self.new_zipinfo(path, data, category)
+        chunk_size = self.STREAM_CHUNK_SIZE
+        with self.zfile.open(zinfo, "w") as f_out:
+            for chunk_start in range(0, len(data), chunk_size):
+                f_out.write(data[chunk_start:chunk_start + chunk_size])
+        self.record_stats(category, zinfo, time.perf_counter() - t0)
+
+    def compressed_member(self, path, data):
+        """Return ``(category, zinfo, payload, seconds)`` for the given member
+
+        The *payload* is the data as it is to appear in the zipfile, i.e.,
+        compressed if the policy says so.  This is the part of the work which
+        can be done in a worker thread.
+        """
+        t0 = time.perf_counter()
+        category = self.policy.category(path, data)
+        zinfo = self.new_zipinfo(path, data, category)
+        zinfo.CRC = zlib.crc32(data)
+        if zinfo.compress_type == zipfile.ZIP_DEFLATED:
+            # As in zipfile's own compressor: a raw deflate stream.
+            compress_level = getattr(zinfo, ZIPINFO_COMPRESS_LEVEL_NAME)
+            if compress_level is None:
+                compress_level = zlib.Z_DEFAULT_COMPRESSION
+            compressor = zlib.compressobj(compress_level, zlib.DEFLATED, -15)
+            payload = compressor.compress(data) + compressor.flush()
+        else:
+            payload = data
+        zinfo.compress_size = len(payload)
+        return category, zinfo, payload, time.perf_counter() - t0
+
+    def append_next_pending_member(self):
+        category, zinfo, payload, seconds = self.pending_members.popleft().result()
+        self.append_compressed_member(zinfo, payload)
+        self.record_stats(category, zinfo, seconds)
+
+    def append_compressed_member(self, zinfo, payload):
+        """Append to the zipfile a member whose CRC and sizes are already known
+
+        This follows what ``ZipFile.open(..., "w")`` does, except that, since
+        the header is correct when first written, there is no need to seek
+        back and re-write it, nor for a data descriptor.
+        """
+        zfile = self.zfile
+        zip64 = (zinfo.file_size > zipfile.ZIP64_LIMIT
+                 or zinfo.compress_size > zipfile.ZIP64_LIMIT)
+        with zfile._lock:
+            if zfile._seekable:
+                zfile.fp.seek(zfile.start_dir)
+            zinfo.header_offset = zfile.fp.tell()
+            zfile._writecheck(zinfo)
+            zfile._didModify = True
+            zfile.fp.write(zinfo.FileHeader(zip64))
+            zfile.fp.write(payload)
+            zfile.start_dir = zfile.fp.tell()
+            zfile.filelist.append(zinfo)
+            zfile.NameToInfo[zinfo.filename] = zinfo
+
+    def record_stats(self, category, zinfo, seconds):
+        stats = self.stats.setdefault(category, CategoryStats())
+        stats.n_members += 1
+        stats.n_bytes_in += zinfo.file_size
+        stats.n_bytes_out += zinfo.compress_size
+        stats.seconds += seconds
+
+    @property
+    def stats_lines(self):
+        """Human-readable summary of ``stats``, one line per category"""
+        return [f"{category}: {stats}"
+                for category, stats in sorted(self.stats.items())]
@@ -1,18 +1,24 @@
 from dataclasses import dataclass
-from typing import Dict
+from typing import Dict, Optional
 import yaml
+import json
 import bs4
 from pathlib import Path
 import enum
-import zipfile
-import copy
 import pygit2
 import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from contextlib import closing
+from collections import deque
 
-from .fromgitrepo import git_repository
 from .fromgitrepo.tutorial_history import ProjectHistory
-from .fromgitrepo.tutorial_bundle import TutorialBundle
+from .fromgitrepo.build_cache import BuildCache
+from .fromgitrepo.tutorial_bundle import TutorialBundle, SharedAssetStore
+from .fromgitrepo.tutorial_html_fragment import html_attribute
+from .fromgitrepo.zip_writer import ZipWriter
+from .fromgitrepo.directory_writer import DirectoryWriter
+from .fromgitrepo.sidecar_writer import SidecarWriter
 from .fromgitrepo.errors import InternalError, TutorialStructureError
 
 
@@ -24,6 +30,26 @@ def yaml_load(yaml_content):
     return yaml.load(yaml_content, yaml.Loader)
 
 
+# Each worker process of a parallel build opens the repository (and build-cache)
+# once, in init_bundle_worker(), and keeps them here for all the bundles it
+# builds.
+bundle_worker_state = {}
+
+
+def init_bundle_worker(repo_path):
+    repo = pygit2.Repository(repo_path)
+    bundle_worker_state["repo"] = repo
+    bundle_worker_state["build_cache"] = BuildCache.for_repository(repo)
+
+
+def bundle_from_tip_in_worker(tip_oid_string, separate_code_snapshots):
+    project_history = ProjectHistory(bundle_worker_state["repo"],
+                                     tip_oid_string,
+                                     build_cache=bundle_worker_state["build_cache"])
+    return TutorialBundle.from_project_history(project_history,
+                                               separate_code_snapshots)
+
+
 @dataclass
 class TutorialSummary:
     name: str  # Currently just for human readers
@@ -49,7 +75,16 @@ class TutorialInfo:
 
 @dataclass
 class TutorialCollection:
+    """Collection of tutorials, all sharing the one open repository
+
+    The collection owns the ``repo`` and ``build_cache`` which all its
+    tutorials' histories use; call :py:meth:`close` (e.g., via
+    ``contextlib.closing()``) to free them once finished with the collection.
+    """
+
     tutorials: Dict[str, TutorialInfo]
+    repo: Optional[pygit2.Repository] = None
+    build_cache: Optional[BuildCache] = None
 
     class IndexSource(enum.Enum):
         RECIPES_TIP = enum.auto()
@@ -69,36 +104,41 @@ class TutorialCollection:
 
     @classmethod
     def from_repo_path(cls, repo_path, index_source):
-        with git_repository(repo_path) as repo:
-            content = cls.index_yaml_content(repo, index_source)
-            tutorial_dicts = yaml_load(content)
+        repo = pygit2.Repository(repo_path)
+        build_cache = BuildCache.for_repository(repo)
+
+        content = cls.index_yaml_content(repo, index_source)
+        tutorial_dicts = yaml_load(content)
 
         tutorials = {d["name"]: TutorialInfo(d["name"],
                                              d["tip-commit"],
-                                             ProjectHistory(repo_path,
-                                                            d["tip-commit"]))
+                                             ProjectHistory(repo,
+                                                            d["tip-commit"],
+                                                            build_cache=build_cache))
                      for d in tutorial_dicts}
-        return cls(tutorials)
+        return cls(tutorials, repo, build_cache)
 
     @classmethod
     def from_releases_commit(cls, repo_path, revision):
         missing_files = []
-        with git_repository(repo_path) as repo:
-            try:
-                index_wrt_branches = yaml_load(
-                    file_contents_at_revision(repo, revision, "index.yaml")
-                )
-            except KeyError:
-                missing_files.append("index.yaml")
+        repo = pygit2.Repository(repo_path)
 
-            try:
-                build_info = yaml_load(
-                    file_contents_at_revision(repo, revision, "build-sources.yaml")
-                )
-            except KeyError:
-                missing_files.append("build-sources.yaml")
+        try:
+            index_wrt_branches = yaml_load(
+                file_contents_at_revision(repo, revision, "index.yaml")
+            )
+        except KeyError:
+            missing_files.append("index.yaml")
+
+        try:
+            build_info = yaml_load(
+                file_contents_at_revision(repo, revision, "build-sources.yaml")
+            )
+        except KeyError:
+            missing_files.append("build-sources.yaml")
 
         if missing_files:
+            repo.free()
             raise RuntimeError(f'could not find {missing_files} in "{revision}"')
 
         revision_from_branch_name = {
@@ -109,47 +149,237 @@ class TutorialCollection:
             tip = descriptor["tip-commit"]
             if tip not in revision_from_branch_name:
                 name = descriptor["name"]
+                repo.free()
                 raise RuntimeError(f'no tip-commit found for "{name}" (tip "{tip}")')
 
+        build_cache = BuildCache.for_repository(repo)
         tutorials = {
             d["name"]: TutorialInfo(
                 d["name"],
                 d["tip-commit"],
-                ProjectHistory(repo_path, revision_from_branch_name[d["tip-commit"]]),
+                ProjectHistory(repo,
+                               revision_from_branch_name[d["tip-commit"]],
+                               build_cache=build_cache),
             )
             for d in index_wrt_branches
         }
 
-        return cls(tutorials)
-
-    def write_to_zipfile(self, maybe_collection_oid, zfile):
-        bundles = [TutorialBundle.from_project_history(info.project_history)
-                   for info in self.tutorials.values()]
-
-        for bundle in bundles:
-            bundle.write_to_zipfile(zfile)
-
-        index_soup = bs4.BeautifulSoup('<div class="tutorial-index"></div>',
-                                       "html.parser")
-        index_div = index_soup.find("div")
-
-        if maybe_collection_oid is not None:
-            index_div.attrs["data-collection-sha1"] = str(maybe_collection_oid)
-
-        for bundle in bundles:
-            summary_div = copy.deepcopy(bundle.summary_html)
-            summary_div["data-tutorial-name"] = bundle.top_level_directory_name
-            index_div.append(summary_div)
-
-        zfile.writestr("tutorial-index.html", index_soup.encode("utf-8"))
-
-    def write_new_zipfile(self, maybe_collection_oid, out_file):
-        bare_zfile = zipfile.ZipFile(out_file,
-                                     mode="w",
-                                     compression=zipfile.ZIP_DEFLATED)
-
-        with closing(bare_zfile) as zfile:
-            self.write_to_zipfile(maybe_collection_oid, zfile)
+        return cls(tutorials, repo, build_cache)
+
+    def close(self):
+        """Free the repository and cache shared by this collection's tutorials"""
+        if self.build_cache is not None:
+            self.build_cache.close()
+            self.build_cache = None
+        if self.repo is not None:
+            self.repo.free()
+            self.repo = None
+
+    def build_plan(self, separate_code_snapshots=False):
+        """List of ``(name, is_cached)`` pairs, one per tutorial
+
+        A tutorial whose bundle is already in the build-cache will not be
+        rebuilt.
+        """
+        return [
+            (name,
+             TutorialBundle.cached_json_value(info.project_history,
+                                              separate_code_snapshots)
+             is not None)
+            for name, info in self.tutorials.items()
+        ]
+
+    def bundles(self, n_jobs=1, separate_code_snapshots=False):
+        """Generate the :py:class:`TutorialBundle` for each tutorial, in order
+
+        Bundles already in the build-cache are taken from there.  If *n_jobs* is
+        more than one, build the others in a pool of that many worker
+        processes, each with its own open repository.  Bundles are built as
+        they are asked for (with a few in hand, if building in parallel), so
+        a caller which handles one bundle at a time need not keep them all
+        in memory at once.
+
+        See :py:class:`TutorialBundle` for *separate_code_snapshots*.
+        """
+        histories = [info.project_history for info in self.tutorials.values()]
+
+        if n_jobs == 1:
+            for history in histories:
+                yield TutorialBundle.from_project_history_using_cache(
+                    history,
+                    separate_code_snapshots,
+                )
+            return
+
+        # Use "spawn" so that no worker inherits libgit2 or SQLite state from us.
+        executor = ProcessPoolExecutor(
+            max_workers=n_jobs,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_bundle_worker,
+            initargs=(self.repo.path,),
+        )
+        with executor:
+            # Each entry is a (history, cached-value, future) triple, with
+            # exactly one of cached-value and future being None.
+            pending = deque()
+            histories_iter = iter(histories)
+
+            def submit_next():
+                history = next(histories_iter, None)
+                if history is None:
+                    return
+                value = TutorialBundle.cached_json_value(history,
+                                                         separate_code_snapshots)
+                future = (executor.submit(bundle_from_tip_in_worker,
+                                          history.tip_oid_string,
+                                          separate_code_snapshots)
+                          if value is None
+                          else None)
+                pending.append((history, value, future))
+
+            for _ in range(2 * n_jobs):
+                submit_next()
+
+            while pending:
+                history, value, future = pending.popleft()
+                submit_next()
+                if future is None:
+                    bundle = TutorialBundle.from_json_value(value, self.repo)
+                    bundle.log_build_warnings()
+                    yield bundle
+                else:
+                    bundle = future.result()
+                    bundle.attach_repository(self.repo)
+                    bundle.store_in_cache(history)
+                    yield bundle
+
+    def write_to_zipfile(
+            self,
+            maybe_collection_oid,
+            zip_writer,
+            n_jobs=1,
+            dedup_assets=False,
+            rich_asset_manifest=False,
+            separate_code_snapshots=False,
+    ):
+        """Write all tutorials, and the index of them, via *zip_writer*
+
+        The *zip_writer* can be a :py:class:`ZipWriter` or anything with the
+        same ``write()`` method, such as a :py:class:`DirectoryWriter`.
+
+        If *dedup_assets* is true, project assets are written once each, to a
+        :py:class:`SharedAssetStore`, however many tutorials use them.  If
+        *rich_asset_manifest* is true, each tutorial's ``project-assets.json``
+        describes each asset's size, hash, MIME type, etc.  If
+        *separate_code_snapshots* is true, each tutorial's versions of its code
+        are written to its ``code-snapshots.json`` rather than into its HTML.
+
+        Each bundle is written as soon as it is built, and then dropped,
+        keeping only its summary and sizes for the index.  The history behind
+        it discards its cached values too.
+
+        The index is written both as ``tutorial-index.html``, holding the
+        tutorials' summaries, and as ``tutorial-index.json``, giving each
+        tutorial's name, tip commit, directory, number of chapters, and sizes.
+        """
+        shared_asset_store = SharedAssetStore() if dedup_assets else None
+        dirnames_and_summaries = []
+        index_entries = []
+        infos = list(self.tutorials.values())
+        bundles = self.bundles(n_jobs, separate_code_snapshots)
+        for info, bundle in zip(infos, bundles):
+            bundle.write_to_zipfile(zip_writer,
+                                    shared_asset_store,
+                                    rich_asset_manifest)
+            dirnames_and_summaries.append(
+                (str(bundle.top_level_directory_name), bundle.summary_html)
+            )
+            index_entries.append(dict(info.summary_dict,
+                                      n_chapters=bundle.n_chapters,
+                                      n_bytes=bundle.n_bytes))
+            del bundle
+            info.project_history.discard_cached_values()
+
+        index_html = index_html_from_summaries(maybe_collection_oid,
+                                               dirnames_and_summaries)
+        zip_writer.write("tutorial-index.html", index_html.encode("utf-8"))
+
+        index_json_value = {
+            "collection_sha1": (None if maybe_collection_oid is None
+                                else str(maybe_collection_oid)),
+            "tutorials": index_entries,
+        }
+        index_json = json.dumps(index_json_value, separators=(",", ":"))
+        zip_writer.write("tutorial-index.json", index_json.encode("utf-8"))
+
+    def write_new_zipfile(
+            self,
+            maybe_collection_oid,
+            out_file,
+            n_jobs=1,
+            compression_policy=None,
+            n_zip_threads=1,
+            deterministic=False,
+            path_prefix="",
+            dedup_assets=False,
+            rich_asset_manifest=False,
+            sidecar_encodings=(),
+            separate_code_snapshots=False,
+    ):
+        """Write the collection as a new zipfile; return the :py:class:`ZipWriter`
+
+        If any *sidecar_encodings* are given, the HTML and JSON files also get
+        compressed copies, via a :py:class:`SidecarWriter`, which is returned
+        instead.  The writer is closed, but its ``stats`` are available.
+        """
+        zip_writer = ZipWriter.for_new_file(out_file,
+                                            compression_policy,
+                                            n_zip_threads,
+                                            deterministic,
+                                            path_prefix)
+        if sidecar_encodings:
+            zip_writer = SidecarWriter(zip_writer, sidecar_encodings)
+        with closing(zip_writer):
+            self.write_to_zipfile(maybe_collection_oid,
+                                  zip_writer,
+                                  n_jobs,
+                                  dedup_assets,
+                                  rich_asset_manifest,
+                                  separate_code_snapshots)
+        return zip_writer
+
+    def write_to_directory(
+            self,
+            maybe_collection_oid,
+            out_dir,
+            n_jobs=1,
+            path_prefix="",
+            dedup_assets=False,
+            rich_asset_manifest=False,
+            sidecar_encodings=(),
+            separate_code_snapshots=False,
+            delete_stale=False,
+    ):
+        """Write the collection's files under *out_dir*, only where changed
+
+        Return the :py:class:`DirectoryWriter` used, whose ``stats`` record how
+        many files were written and how many were already up to date.  As for
+        :py:meth:`write_new_zipfile`, any *sidecar_encodings* give compressed
+        copies of HTML and JSON files.  If *delete_stale* is true, files under
+        the collection's directory which are not part of the collection are
+        deleted; otherwise they are left alone.
+        """
+        directory_writer = DirectoryWriter(out_dir, path_prefix, delete_stale)
+        if sidecar_encodings:
+            directory_writer = SidecarWriter(directory_writer, sidecar_encodings)
+        with closing(directory_writer):
+            self.write_to_zipfile(maybe_collection_oid,
+                                  directory_writer,
+                                  n_jobs,
+                                  dedup_assets,
+                                  rich_asset_manifest,
+                                  separate_code_snapshots)
+        return directory_writer
 
     @property
     def gathered_tip_oids(self):
@@ -161,6 +391,41 @@ class TutorialCollection:
         return [info.summary_dict for info in self.tutorials.values()]
 
 
+def html_with_attribute(element_html, name, value):
+    """The serialised *element_html* with an attribute added to its start tag
+
+    The attribute goes last, which is where BeautifulSoup puts it when
+    serialising, as long as its name sorts after those already there.  The
+    start tag ends at the first ``>``, since BeautifulSoup escapes any ``>``
+    in attribute values.
+    """
+    start_tag_end = element_html.index(">")
+    return (element_html[:start_tag_end]
+            + html_attribute(name, value)
+            + element_html[start_tag_end:])
+
+
+def index_html_from_summaries(maybe_collection_oid, dirnames_and_summaries):
+    """HTML of the collection's index, from its tutorials' summary HTML
+
+    Each ``(dirname, summary_html)`` pair gives a tutorial's directory name
+    and its summary's serialised ``<div>``, which gets a
+    ``data-tutorial-name`` attribute.  The summaries are spliced in as
+    strings, without being parsed.
+    """
+    index_attributes = html_attribute("class", "tutorial-index")
+    if maybe_collection_oid is not None:
+        index_attributes += html_attribute("data-collection-sha1",
+                                           str(maybe_collection_oid))
+    pieces = [f"<div{index_attributes}>"]
+    for dirname, summary_html in dirnames_and_summaries:
+        pieces.append(html_with_attribute(summary_html,
+                                          "data-tutorial-name",
+                                          dirname))
+    pieces.append("</div>")
+    return "".join(pieces)
+
+
 def create_signature(repo):
     return pygit2.Signature(repo.config['user.name'],
                             repo.config['user.email'],
@@ -162,32 +162,44 @@ async def rebuild_tutorial(
         repository_path,
         tip_revision
 ):
-    # TODO: Don't keep rebuilding the entire ProjectHistory if all that's
-    # changed is the tutorial text markdown file.  Would require some rework of
-    # the ProjectHistory and some check that the HEAD (say) hasn't moved on
-    # between last time we processed the repo.
-    while True:
-        print("rebuild_tutorial(): waiting for IDE msg")
-        msg = await read_q.get()
-        print(f'rebuild_tutorial(): got {msg}')
-        if msg.kind == "tutorial":
-            print("rebuild_tutorial(): rebuilding html-fragment")
-            try:
-                project_history = ProjectHistory(
-                    repository_path,
-                    tip_revision,
-                    ProjectHistory.TutorialTextSource.WORKING_DIRECTORY
-                )
-                tutorial_html = tutorial_div_from_project_history(project_history)
-                html_msg = msg.with_new_text(str(tutorial_html))
-                print(f'rebuild_tutorial(): forwarding transformed {html_msg}')
-                await write_q.put(html_msg)
-            except Exception as err:
-                print("rebuild_tutorial(): ERROR rebuilding html-fragment:"
-                      f" {type(err).__name__}: {err}")
-        elif msg.kind == "code":
-            print(f'rebuild_tutorial(): forwarding {msg} as-is')
-            await write_q.put(msg)
+    # Keep one ProjectHistory alive across rebuilds, refreshing it in case the
+    # tip has moved on since last time.  Usually it has not, or has only gained
+    # a few commits, so this is much cheaper than building a new one.  If
+    # anything goes wrong, start afresh next time.
+    project_history = None
+    try:
+        while True:
+            print("rebuild_tutorial(): waiting for IDE msg")
+            msg = await read_q.get()
+            print(f'rebuild_tutorial(): got {msg}')
+            if msg.kind == "tutorial":
+                print("rebuild_tutorial(): rebuilding html-fragment")
+                try:
+                    if project_history is None:
+                        project_history = ProjectHistory(
+                            repository_path,
+                            tip_revision,
+                            ProjectHistory.TutorialTextSource.WORKING_DIRECTORY
+                        )
+                    else:
+                        n_new_commits = project_history.refresh(tip_revision)
+                        print(f"rebuild_tutorial(): {n_new_commits} new commit/s")
+                    tutorial_html = tutorial_div_from_project_history(project_history)
+                    html_msg = msg.with_new_text(str(tutorial_html))
+                    print(f'rebuild_tutorial(): forwarding transformed {html_msg}')
+                    await write_q.put(html_msg)
+                except Exception as err:
+                    print("rebuild_tutorial(): ERROR rebuilding html-fragment:"
+                          f" {type(err).__name__}: {err}")
+                    if project_history is not None:
+                        project_history.close()
+                    project_history = None
+            elif msg.kind == "code":
+                print(f'rebuild_tutorial(): forwarding {msg} as-is')
+                await write_q.put(msg)
+    finally:
+        if project_history is not None:
+            project_history.close()
 
 
 class MessageBroker:
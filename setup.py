@@ -1,10 +1,17 @@
 #!/usr/bin/env python
 
 from setuptools import setup, find_packages
+import re
 
 with open('README.rst') as readme_file:
     readme = readme_file.read()
 
+# The version is given only in the package itself.
+with open('pytchbuild/__init__.py') as init_file:
+    version = re.search(r'^__version__ = "(.*)"$',
+                        init_file.read(),
+                        re.MULTILINE).group(1)
+
 requirements = [
     'cached_property',
     'pygit2>=1.2.1',
@@ -30,6 +37,11 @@ setup(
         'Programming Language :: Python :: 3',
         'Programming Language :: Python :: 3.7',
         'Programming Language :: Python :: 3.8',
+        'Programming Language :: Python :: 3.9',
+        'Programming Language :: Python :: 3.10',
+        'Programming Language :: Python :: 3.11',
+        'Programming Language :: Python :: 3.12',
+        'Programming Language :: Python :: 3.13',
     ],
     description="Assemble Pytch website from content, IDE, and tutorials",
     entry_points={
@@ -47,6 +59,6 @@ setup(
     name='pytchbuild',
     packages=find_packages(include=['pytchbuild', 'pytchbuild.*']),
     url='https://github.com/pytchlang/pytch-build/',
-    version='0.1.0',
+    version=version,
     zip_safe=False,
 )
@@ -1,8 +1,22 @@
+import pytest
 from click.testing import CliRunner
 from pytchbuild.cli import main
+from pytchbuild.gather_tutorials import main as gather_tutorials_main
 
 
 def test_cli_runs():
     runner = CliRunner()
     result = runner.invoke(main, ["--help"])
     assert "repository" in result.output
+
+
+@pytest.mark.parametrize(
+    "zipfile_args",
+    [["--deterministic"], ["--zip-threads", "2"], ["--deflate-level", "9"]],
+)
+def test_gather_rejects_zipfile_options_with_output_dir(tmp_path, zipfile_args):
+    runner = CliRunner()
+    result = runner.invoke(gather_tutorials_main,
+                           ["--output-dir", str(tmp_path)] + zipfile_args)
+    assert result.exit_code != 0
+    assert f"cannot use {zipfile_args[0]} with an output directory" in result.output
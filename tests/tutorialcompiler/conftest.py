@@ -0,0 +1,109 @@
+import pytest
+import pygit2
+import yaml
+from pathlib import Path
+
+
+class SyntheticTutorialRepo:
+    """Throwaway git repo into which tutorial histories can be written
+
+    Each tutorial gets its own branch, rooted at its own ``{base}`` commit, and
+    lives in its own top-level directory.  Files are given as a dict mapping
+    path (relative to the tutorial directory) to ``bytes``.
+    """
+
+    def __init__(self, path):
+        self.repo = pygit2.init_repository(str(path))
+        self.signature = pygit2.Signature("A U Thor", "author@example.com", 0, 0)
+        self.files_from_dirname = {}
+
+    def write_tree(self, files):
+        subtrees = {}
+        builder = self.repo.TreeBuilder()
+        for path, data in files.items():
+            head, sep, tail = path.partition("/")
+            if sep:
+                subtrees.setdefault(head, {})[tail] = data
+            else:
+                blob_id = self.repo.create_blob(data)
+                builder.insert(head, blob_id, pygit2.GIT_FILEMODE_BLOB)
+        for name, subtree_files in subtrees.items():
+            builder.insert(name,
+                           self.write_tree(subtree_files),
+                           pygit2.GIT_FILEMODE_TREE)
+        return builder.write()
+
+    def commit(self, branch_name, dirname, files, message):
+        ref_name = f"refs/heads/{branch_name}"
+        parents = ([self.repo.references[ref_name].target]
+                   if ref_name in self.repo.references
+                   else [])
+        tree_id = self.write_tree({f"{dirname}/{path}": data
+                                   for path, data in files.items()})
+        return self.repo.create_commit(ref_name,
+                                       self.signature, self.signature,
+                                       message, tree_id, parents)
+
+    def add_tutorial(self, dirname, n_code_commits=4, n_asset_commits=2):
+        """Write a tutorial history to a branch named for *dirname*
+
+        The history is: a ``{base}`` commit; *n_asset_commits* commits
+        each adding one project asset; *n_code_commits* commits each
+        appending a line to ``code.py`` and tagged ``{#step-N}``; and a
+        final commit adding the tutorial text.  Return the tip oid.
+        """
+        files = {
+            "code.py": b"",
+            "summary.md": f"# Summary of {dirname}\n".encode(),
+            "tutorial.md": b"",
+        }
+        self.commit(dirname, dirname, files, "{base} Add skeleton\n")
+
+        for i in range(n_asset_commits):
+            asset_path = f"project-assets/sprite-{i}.png"
+            files[asset_path] = f"not-really-a-PNG-{dirname}-{i}".encode()
+            self.commit(dirname, dirname, files,
+                        f"Add sprite {i}\n\nDrawn by *Artist {i}*.\n")
+
+        code_lines = []
+        for i in range(n_code_commits):
+            code_lines.append(f"step_{i} = {i}\n")
+            files["code.py"] = "".join(code_lines).encode()
+            self.commit(dirname, dirname, files,
+                        f"{{#step-{i}}} Add step {i}\n")
+
+        tutorial_text = "".join(
+            [f"# Tutorial {dirname}\n\n{{{{< asset-credits >}}}}\n\n---\n"]
+            + [(f"\n## Chapter {i}\n" if i % 5 == 0 else "")
+               + f"\n{{{{< commit step-{i} >}}}}\n"
+               for i in range(n_code_commits)]
+        )
+        files["tutorial.md"] = tutorial_text.encode()
+        self.files_from_dirname[dirname] = files
+        return self.commit(dirname, dirname, files, "Add tutorial text\n")
+
+    def commit_changes(self, dirname, changed_files, message):
+        """Commit a change to some files of a tutorial made by add_tutorial()"""
+        files = self.files_from_dirname[dirname]
+        files.update(changed_files)
+        return self.commit(dirname, dirname, files, message)
+
+    def write_working_index(self, dirnames):
+        """Write an ``index.yaml`` listing the given tutorials to the workdir"""
+        index = [{"name": f"Tutorial {dirname}", "tip-commit": dirname}
+                 for dirname in dirnames]
+        index_path = Path(self.repo.workdir) / "index.yaml"
+        index_path.write_text(yaml.dump(index))
+
+
+@pytest.fixture
+def synthetic_repo(tmp_path):
+    return SyntheticTutorialRepo(tmp_path / "synthetic-tutorials")
+
+
+@pytest.fixture
+def make_synthetic_repo(tmp_path):
+    """Factory for synthetic repos, for tests needing more than one"""
+    def make(dirname):
+        return SyntheticTutorialRepo(tmp_path / dirname)
+    return make
@@ -0,0 +1,48 @@
+import pytest
+import struct
+import zlib
+
+import pytchbuild.tutorialcompiler.fromgitrepo.asset_metadata as AM
+
+
+def png_bytes(width, height):
+    ihdr_data = struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0)
+    ihdr_chunk = (struct.pack(">I", len(ihdr_data)) + b"IHDR" + ihdr_data
+                  + struct.pack(">I", zlib.crc32(b"IHDR" + ihdr_data)))
+    return AM.PNG_SIGNATURE + ihdr_chunk
+
+
+def jpeg_bytes(width, height):
+    app0_segment = b"\xff\xe0" + struct.pack(">H", 16) + b"JFIF\0" + bytes(9)
+    sof0_segment = (b"\xff\xc0" + struct.pack(">HBHHB", 11, 8, height, width, 1)
+                    + bytes(3))
+    return AM.JPEG_SOI + app0_segment + b"\xff" + sof0_segment + b"\xff\xd9"
+
+
+class TestImageDimensions:
+    @pytest.mark.parametrize(
+        "data, exp_dimensions",
+        [
+            (png_bytes(480, 360), (480, 360)),
+            (memoryview(png_bytes(1, 70000)), (1, 70000)),
+            (b"GIF89a" + struct.pack("<HH", 32, 24) + bytes(10), (32, 24)),
+            (jpeg_bytes(640, 480), (640, 480)),
+            (b"not-really-a-PNG", None),
+            (AM.PNG_SIGNATURE + b"truncated", None),
+            (AM.JPEG_SOI + b"\xff\xe0\x00\x10", None),
+        ]
+    )
+    def test_image_dimensions(self, data, exp_dimensions):
+        assert AM.image_dimensions(data) == exp_dimensions
+
+
+@pytest.mark.parametrize(
+    "path, exp_mime_type",
+    [
+        ("boing/project-assets/ball.png", "image/png"),
+        ("boing/project-assets/ping.mp3", "audio/mpeg"),
+        ("boing/project-assets/level.unknown-suffix", "application/octet-stream"),
+    ]
+)
+def test_mime_type(path, exp_mime_type):
+    assert AM.mime_type(path) == exp_mime_type
@@ -0,0 +1,56 @@
+import pytest
+
+import pytchbuild.tutorialcompiler.fromgitrepo.blob_cache as BLC
+import pytchbuild.tutorialcompiler.fromgitrepo.tutorial_history as TH
+
+
+@pytest.fixture
+def blob_ids(synthetic_repo):
+    repo = synthetic_repo.repo
+    return [repo.create_blob(f"blob-{i}-{'x' * 90}".encode()) for i in range(4)]
+
+
+class TestBlobCache:
+    def test_hits_and_misses(self, synthetic_repo, blob_ids):
+        cache = BLC.BlobCache()
+        repo = synthetic_repo.repo
+        assert cache.data(repo, blob_ids[0]).startswith(b"blob-0-")
+        assert cache.text(repo, blob_ids[0]).startswith("blob-0-")
+        assert cache.data(repo, blob_ids[1]).startswith(b"blob-1-")
+        assert cache.stats == {
+            "n_entries": 2,
+            "total_size": 2 * 97 + 97,
+            "n_hits": 1,
+            "n_misses": 2,
+        }
+
+    def test_eviction(self, synthetic_repo, blob_ids):
+        cache = BLC.BlobCache(max_size=250)
+        repo = synthetic_repo.repo
+        for blob_id in blob_ids[:3]:
+            cache.data(repo, blob_id)
+        assert list(cache.entry_from_id) == [str(b) for b in blob_ids[1:3]]
+
+        # Using blob 1 makes blob 2 the least-recently-used:
+        cache.data(repo, blob_ids[1])
+        cache.data(repo, blob_ids[3])
+        assert list(cache.entry_from_id) == [str(b) for b in [blob_ids[1], blob_ids[3]]]
+        assert cache.total_size <= 250
+
+    def test_too_large(self, synthetic_repo, blob_ids):
+        cache = BLC.BlobCache(max_size=50)
+        assert cache.text(synthetic_repo.repo, blob_ids[0]).startswith("blob-0")
+        assert cache.stats["n_entries"] == 0
+
+    def test_shared_across_histories(self, synthetic_repo):
+        synthetic_repo.add_tutorial("tut")
+        BLC.shared_blob_cache.clear()
+
+        for _ in range(2):
+            history = TH.ProjectHistory(synthetic_repo.repo.path, "tut")
+            history.final_code_text
+            history.code_text_from_slug("step-3")
+
+        # Final code and code as of "step-3" are the same blob:
+        assert BLC.shared_blob_cache.n_misses == 1
+        assert BLC.shared_blob_cache.n_hits == 3
@@ -0,0 +1,69 @@
+import pytest
+
+import pytchbuild.tutorialcompiler.fromgitrepo.build_cache as BC
+import pytchbuild.tutorialcompiler.fromgitrepo.tutorial_history as TH
+
+
+class TestBuildCache:
+    def test_round_trip(self):
+        cache = BC.BuildCache()
+        assert cache.get("things", "a") is None
+        cache.put("things", "a", [1, "two", None])
+        assert cache.get("things", "a") == [1, "two", None]
+        assert cache.get("other-things", "a") is None
+
+    def test_persistent(self, tmp_path):
+        db_path = tmp_path / "cache.sqlite3"
+        cache = BC.BuildCache(db_path)
+        cache.put("things", "a", {"x": 42})
+        cache.close()
+
+        reopened_cache = BC.BuildCache(db_path)
+        assert reopened_cache.get("things", "a") == {"x": 42}
+
+    def test_max_n_entries(self):
+        cache = BC.BuildCache()
+        cache.put("unbounded", "a", 1)
+        for i in range(10):
+            cache.put("things", str(i), i, max_n_entries=3)
+        assert cache.n_entries("things") == 3
+        assert [cache.get("things", str(i)) for i in range(10)] == [None] * 7 + [7, 8, 9]
+
+        # Storing an entry again makes it the most recent.
+        cache.put("things", "7", 77, max_n_entries=3)
+        cache.put("things", "10", 10, max_n_entries=3)
+        assert [cache.get("things", k) for k in ["7", "8", "9", "10"]] == [77, None, 9, 10]
+        assert cache.get("unbounded", "a") == 1
+
+    def test_for_repository(self, synthetic_repo):
+        cache = BC.BuildCache.for_repository(synthetic_repo.repo)
+        assert cache.db_path.parent.name == "pytchbuild-cache"
+        assert cache.db_path.parent.parent.name == ".git"
+
+
+class TestCommitDeltasCache:
+    @pytest.fixture
+    def tip_oid(self, synthetic_repo):
+        return synthetic_repo.add_tutorial("tut", n_code_commits=20)
+
+    def test_history_uses_cache(self, synthetic_repo, tip_oid, monkeypatch):
+        repo_path = synthetic_repo.repo.path
+        history_0 = TH.ProjectHistory(repo_path, tip_oid.hex)
+        labels_0 = [pc.summary_label for pc in history_0.project_commits]
+        patch_0 = history_0.code_patch_against_parent("step-19")
+
+        def forbid_diff(self):
+            raise AssertionError("should have used cached deltas")
+
+        monkeypatch.setattr(TH.ProjectCommit,
+                            "diff_against_parent_or_empty",
+                            property(forbid_diff))
+
+        history_1 = TH.ProjectHistory(repo_path, tip_oid.hex)
+        labels_1 = [pc.summary_label for pc in history_1.project_commits]
+        assert labels_1 == labels_0
+        assert labels_1[-1] == "BASE"
+        assert labels_1[0] == "tutorial-text"
+        assert labels_1[1] == "#step-19"
+        patch_1 = history_1.code_patch_against_parent("step-19")
+        assert patch_1.line_stats == patch_0.line_stats
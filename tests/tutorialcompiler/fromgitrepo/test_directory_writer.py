@@ -0,0 +1,80 @@
+import pytest
+import os
+import pygit2
+
+import pytchbuild.tutorialcompiler.fromgitrepo.directory_writer as DW
+
+
+@pytest.mark.parametrize("data", [b"", b"hello world", bytes(range(256)) * 10])
+def test_git_blob_oid_hex(data):
+    assert DW.git_blob_oid_hex(memoryview(data)) == str(pygit2.hash(data))
+
+
+class TestDirectoryWriter:
+    def test_only_changed_written(self, tmp_path):
+        def write_all(contents):
+            writer = DW.DirectoryWriter(tmp_path, "tutorials/v1")
+            for path, data in contents.items():
+                writer.write(path, data)
+            writer.close()
+            return {category: stats.n_members
+                    for category, stats in writer.stats.items()}
+
+        contents = {
+            "tut/tutorial.html": b"<div>Hello</div>",
+            "tut/project-assets/sprite.png": memoryview(b"not-really-a-PNG"),
+        }
+        assert write_all(contents) == {"written": 2}
+
+        out_dir = tmp_path / "tutorials/v1/tut"
+        html_path = out_dir / "tutorial.html"
+        assert html_path.read_bytes() == b"<div>Hello</div>"
+        assert (html_path.stat().st_mode & 0o777) == 0o644
+
+        # Make it detectable whether a file gets rewritten:
+        os.utime(html_path, ns=(0, 0))
+        assert write_all(contents) == {"unchanged": 2}
+        assert html_path.stat().st_mtime_ns == 0
+
+        # Same size, different content:
+        contents["tut/tutorial.html"] = b"<div>Howdy</div>"
+        assert write_all(contents) == {"written": 1, "unchanged": 1}
+        assert html_path.read_bytes() == b"<div>Howdy</div>"
+        assert sorted(p.name for p in out_dir.iterdir()) == [
+            "project-assets", "tutorial.html"
+        ]
+
+    @pytest.mark.parametrize("delete_stale", [False, True])
+    def test_stale_files(self, tmp_path, delete_stale):
+        def write_all(contents):
+            writer = DW.DirectoryWriter(tmp_path, "tutorials/v1", delete_stale)
+            for path, data in contents.items():
+                writer.write(path, data)
+            writer.close()
+            return {category: stats.n_members
+                    for category, stats in writer.stats.items()}
+
+        outside_path = tmp_path / "index.html"
+        outside_path.write_bytes(b"<p>Not part of the collection</p>")
+
+        contents = {
+            "old-tut/tutorial.html": b"<div>Old</div>",
+            "old-tut/project-assets/sprite.png": b"old-sprite",
+            "tut/tutorial.html": b"<div>Hello</div>",
+        }
+        assert write_all(contents) == {"written": 3}
+
+        del contents["old-tut/tutorial.html"]
+        del contents["old-tut/project-assets/sprite.png"]
+        got_stats = write_all(contents)
+
+        collection_dir = tmp_path / "tutorials/v1"
+        got_paths = sorted(str(p.relative_to(collection_dir))
+                           for p in collection_dir.glob("**/*"))
+        if delete_stale:
+            assert got_stats == {"unchanged": 1, "deleted": 2}
+            assert got_paths == ["tut", "tut/tutorial.html"]
+        else:
+            assert got_stats == {"unchanged": 1}
+            assert "old-tut/project-assets/sprite.png" in got_paths
+        assert outside_path.exists()
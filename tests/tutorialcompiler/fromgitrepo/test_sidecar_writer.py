@@ -0,0 +1,47 @@
+import pytest
+import bz2
+import gzip
+import io
+import lzma
+import zipfile
+
+import pytchbuild.tutorialcompiler.fromgitrepo.sidecar_writer as SW
+import pytchbuild.tutorialcompiler.fromgitrepo.zip_writer as ZW
+
+
+class TestSidecarWriter:
+    @pytest.mark.parametrize("n_threads", [1, 3])
+    def test_sidecars(self, n_threads):
+        contents = [
+            (f"tut-{i}/{basename}", f"{basename} {i}\n".encode() * 100)
+            for i in range(20)
+            for basename in ["tutorial.html", "project-assets.json", "sprite.png"]
+        ]
+
+        out_file = io.BytesIO()
+        zip_writer = ZW.ZipWriter.for_new_file(out_file)
+        writer = SW.SidecarWriter(zip_writer, ["gzip", "bzip2", "xz"], n_threads)
+        for path, data in contents:
+            writer.write(path, data)
+        writer.close()
+
+        zfile = zipfile.ZipFile(out_file, "r")
+        exp_names = []
+        for path, _ in contents:
+            exp_names.append(path)
+            if not path.endswith(".png"):
+                exp_names.extend([path + ".gz", path + ".bz2", path + ".xz"])
+        assert zfile.namelist() == exp_names
+
+        for path, data in contents:
+            if not path.endswith(".png"):
+                assert gzip.decompress(zfile.read(path + ".gz")) == data
+                assert bz2.decompress(zfile.read(path + ".bz2")) == data
+                assert lzma.decompress(zfile.read(path + ".xz")) == data
+
+        assert writer.stats is zip_writer.stats
+
+    def test_gzip_deterministic(self):
+        data = b"<div>Hello world</div>"
+        assert SW.gzip_compress(data) == SW.gzip_compress(data)
+        assert gzip.decompress(SW.gzip_compress(data)) == data
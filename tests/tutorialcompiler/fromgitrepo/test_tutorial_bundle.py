@@ -1,6 +1,14 @@
 import pytchbuild.tutorialcompiler.fromgitrepo.tutorial_bundle as TB
+import pytchbuild.tutorialcompiler.fromgitrepo.tutorial_history as TH
+import pytchbuild.tutorialcompiler.fromgitrepo.tutorial_markdown as TM
+import pytest
+import logging
 import zipfile
 import io
+import json
+import bs4
+import struct
+from pathlib import Path
 
 
 def test_bundle(project_history):
@@ -23,3 +31,231 @@ def test_bundle_zipfile(project_history):
         "boing/tutorial-assets/not-a-real-png.png",
         "boing/tutorial.html",
     ]
+
+
+def test_bundle_zipfile_synthetic(synthetic_repo):
+    tip_oid = synthetic_repo.add_tutorial("tut")
+    project_history = TH.ProjectHistory(synthetic_repo.repo.path, tip_oid.hex)
+    bundle = TB.TutorialBundle.from_project_history(project_history)
+    round_trip_file = io.BytesIO()
+    bundle.write_new_zipfile(round_trip_file)
+    zfile = zipfile.ZipFile(round_trip_file, "r")
+
+    assert sorted(zfile.namelist()) == [
+        "tut/project-assets.json",
+        "tut/project-assets/sprite-0.png",
+        "tut/project-assets/sprite-1.png",
+        "tut/summary.html",
+        "tut/tutorial.html",
+    ]
+    assert zfile.read("tut/project-assets/sprite-1.png") == b"not-really-a-PNG-tut-1"
+
+
+class TestBundleCache:
+    def test_round_trip(self, synthetic_repo, monkeypatch):
+        tip_oid = synthetic_repo.add_tutorial("tut")
+        history_0 = TH.ProjectHistory(synthetic_repo.repo.path, tip_oid.hex)
+        bundle_0 = TB.TutorialBundle.from_project_history_using_cache(history_0)
+
+        def forbid_build(*args):
+            raise AssertionError("should have used cached bundle")
+
+        monkeypatch.setattr(TB.TutorialBundle, "from_project_history", forbid_build)
+
+        history_1 = TH.ProjectHistory(synthetic_repo.repo.path, tip_oid.hex)
+        bundle_1 = TB.TutorialBundle.from_project_history_using_cache(history_1)
+        assert bundle_1 == bundle_0
+        assert sorted(asset.data for asset in bundle_1.assets) == [
+            b"not-really-a-PNG-tut-0",
+            b"not-really-a-PNG-tut-1",
+        ]
+
+    def test_warnings_repeated(self, synthetic_repo, caplog):
+        synthetic_repo.add_tutorial("tut")
+        synthetic_repo.commit_changes(
+            "tut",
+            {"code.py": b"unused = True\n"},
+            "{#step-unused} Add step not in tutorial\n",
+        )
+
+        def mismatch_warnings():
+            caplog.clear()
+            history = TH.ProjectHistory(synthetic_repo.repo.path, "tut")
+            TB.TutorialBundle.from_project_history_using_cache(history)
+            return [r.getMessage() for r in caplog.records
+                    if r.levelno == logging.WARNING]
+
+        warnings_0 = mismatch_warnings()
+        assert any(w.startswith("mismatch between commit-slugs") for w in warnings_0)
+        assert "    +++ slugs-used-in-tutorial" in warnings_0
+
+        history = TH.ProjectHistory(synthetic_repo.repo.path, "tut")
+        assert TB.TutorialBundle.cached_json_value(history) is not None
+        assert mismatch_warnings() == warnings_0
+
+    def test_key_depends_on_text(self, synthetic_repo):
+        synthetic_repo.add_tutorial("tut")
+        tutorial_path = Path(synthetic_repo.repo.workdir) / "tut/tutorial.md"
+        tutorial_path.parent.mkdir()
+        tutorial_path.write_text("# Tutorial\n")
+        (tutorial_path.parent / "summary.md").write_text("# Summary\n")
+
+        def build_cache_key(text_source):
+            history = TH.ProjectHistory(synthetic_repo.repo.path, "tut", text_source)
+            return TB.TutorialBundle.build_cache_key(history)
+
+        TTS = TH.ProjectHistory.TutorialTextSource
+        key_0 = build_cache_key(TTS.WORKING_DIRECTORY)
+        assert build_cache_key(TTS.TIP_REVISION) != key_0
+        assert build_cache_key(TTS.WORKING_DIRECTORY) == key_0
+
+        tutorial_path.write_text("# Tutorial, revised\n")
+        assert build_cache_key(TTS.WORKING_DIRECTORY) != key_0
+
+    def test_key_depends_on_html_parser(self, synthetic_repo, monkeypatch):
+        pytest.importorskip("lxml")
+        tip_oid = synthetic_repo.add_tutorial("tut")
+        history = TH.ProjectHistory(synthetic_repo.repo.path, tip_oid.hex)
+        key_0 = TB.TutorialBundle.build_cache_key(history)
+        monkeypatch.setattr(TM, "HTML_PARSER", "lxml")
+        assert TB.TutorialBundle.build_cache_key(history) != key_0
+
+    def test_key_depends_on_code(self, synthetic_repo, monkeypatch):
+        tip_oid = synthetic_repo.add_tutorial("tut")
+        history = TH.ProjectHistory(synthetic_repo.repo.path, tip_oid.hex)
+        key_0 = TB.TutorialBundle.build_cache_key(history)
+        assert TM.rendering_code_digest() == TM.RENDERING_CODE_DIGEST
+        monkeypatch.setattr(TM, "RENDERING_CODE_DIGEST", "0" * 64)
+        assert TB.TutorialBundle.build_cache_key(history) != key_0
+
+    def test_size_bounded(self, synthetic_repo, monkeypatch):
+        monkeypatch.setattr(TB.TutorialBundle, "BUILD_CACHE_MAX_N_ENTRIES", 2)
+        tip_oid = synthetic_repo.add_tutorial("tut")
+        history = TH.ProjectHistory(synthetic_repo.repo.path, tip_oid.hex)
+        bundle = TB.TutorialBundle.from_project_history(history)
+        for i in range(4):
+            monkeypatch.setattr(TM, "RENDERING_CODE_DIGEST", str(i))
+            bundle.store_in_cache(history)
+        build_cache = history.build_cache
+        assert build_cache.n_entries(TB.TutorialBundle.BUILD_CACHE_NAMESPACE) == 2
+        assert TB.TutorialBundle.cached_json_value(history) is not None
+
+    def test_key_depends_on_code_snapshots(self, synthetic_repo):
+        tip_oid = synthetic_repo.add_tutorial("tut")
+        history = TH.ProjectHistory(synthetic_repo.repo.path, tip_oid.hex)
+        inline_key = TB.TutorialBundle.build_cache_key(history)
+        separate_key = TB.TutorialBundle.build_cache_key(history, True)
+        assert separate_key != inline_key
+
+        bundle_0 = TB.TutorialBundle.from_project_history_using_cache(history, True)
+        assert TB.TutorialBundle.cached_json_value(history) is None
+        bundle_1 = TB.TutorialBundle.from_project_history_using_cache(history, True)
+        assert bundle_1 == bundle_0
+
+
+def test_html_parsers_give_same_bundle(synthetic_repo, monkeypatch):
+    pytest.importorskip("lxml")
+    tip_oid = synthetic_repo.add_tutorial("tut", n_code_commits=100)
+    history = TH.ProjectHistory(synthetic_repo.repo.path, tip_oid.hex)
+
+    bundle_from_parser = {}
+    for parser in ["html.parser", "lxml"]:
+        monkeypatch.setattr(TM, "HTML_PARSER", parser)
+        bundle_from_parser[parser] = TB.TutorialBundle.from_project_history(history)
+        history.discard_cached_values()
+
+    exp_bundle = bundle_from_parser["html.parser"]
+    got_bundle = bundle_from_parser["lxml"]
+    assert got_bundle.tutorial_html == exp_bundle.tutorial_html
+    assert got_bundle.summary_html == exp_bundle.summary_html
+
+
+def test_n_chapters(synthetic_repo):
+    synthetic_repo.add_tutorial("tut", n_code_commits=12)
+    tutorial_text = synthetic_repo.files_from_dirname["tut"]["tutorial.md"]
+    raw_html = b'\n<div class="chapter-content">Not a chapter</div>\n'
+    synthetic_repo.commit_changes("tut",
+                                  {"tutorial.md": tutorial_text + raw_html},
+                                  "Add raw HTML to tutorial\n")
+    history = TH.ProjectHistory(synthetic_repo.repo.path, "tut")
+    bundle = TB.TutorialBundle.from_project_history(history)
+    assert bundle.tutorial_html.count('<div class="chapter-content">') == 4
+    assert bundle.n_chapters == 3
+    round_trip_bundle = TB.TutorialBundle.from_json_value(bundle.as_json_value(),
+                                                          history.repo)
+    assert round_trip_bundle.n_chapters == 3
+
+
+def test_separate_code_snapshots(synthetic_repo):
+    tip_oid = synthetic_repo.add_tutorial("tut", n_code_commits=12)
+    history = TH.ProjectHistory(synthetic_repo.repo.path, tip_oid.hex)
+    inline_bundle = TB.TutorialBundle.from_project_history(history)
+    history.discard_cached_values()
+    bundle = TB.TutorialBundle.from_project_history(history, True)
+
+    assert len(bundle.tutorial_html) < len(inline_bundle.tutorial_html)
+    assert bundle.summary_html == inline_bundle.summary_html
+
+    # Looking up each "-oid" attribute in the snapshots gives the code which
+    # would have been inline.
+    code_snapshots = bundle.code_snapshots
+    inline_soup = bs4.BeautifulSoup(inline_bundle.tutorial_html, "html.parser")
+    soup = bs4.BeautifulSoup(bundle.tutorial_html, "html.parser")
+    inline_patches = inline_soup.find_all("div", class_="patch-container")
+    patches = soup.find_all("div", class_="patch-container")
+    assert len(patches) == len(inline_patches) == 12
+    for patch, inline_patch in zip(patches, inline_patches):
+        assert "data-code-as-of-commit" not in patch.attrs
+        assert (code_snapshots[patch["data-code-as-of-commit-oid"]]
+                == inline_patch["data-code-as-of-commit"])
+
+    inline_front_matter = inline_soup.find("div", class_="front-matter")
+    front_matter = soup.find("div", class_="front-matter")
+    for attr_stem in ["data-initial-code", "data-complete-code"]:
+        assert f"{attr_stem}-text" not in front_matter.attrs
+        assert (code_snapshots[front_matter[f"{attr_stem}-oid"]]
+                == inline_front_matter[f"{attr_stem}-text"])
+
+    # Each distinct version of the code once: the empty initial code, and
+    # the code after each step.
+    assert len(code_snapshots) == 13
+
+    out_file = io.BytesIO()
+    bundle.write_new_zipfile(out_file)
+    zfile = zipfile.ZipFile(out_file, "r")
+    assert json.loads(zfile.read("tut/code-snapshots.json")) == code_snapshots
+
+
+def test_rich_asset_manifest(synthetic_repo):
+    # Enough of a PNG for its dimensions to be read:
+    png_data = (b"\x89PNG\r\n\x1a\n" + struct.pack(">I", 13) + b"IHDR"
+                + struct.pack(">II", 480, 360) + bytes(9))
+    synthetic_repo.add_tutorial("tut", n_asset_commits=1)
+    tip_oid = synthetic_repo.commit_changes("tut",
+                                            {"project-assets/ball.png": png_data},
+                                            "Add ball\n")
+    history = TH.ProjectHistory(synthetic_repo.repo.path, tip_oid.hex)
+    bundle = TB.TutorialBundle.from_project_history(history)
+
+    manifest = bundle.assets_manifest(rich_asset_manifest=True)
+    entry_from_path = {entry["path"]: entry for entry in manifest}
+    assert sorted(entry_from_path) == [
+        "tut/project-assets/ball.png",
+        "tut/project-assets/sprite-0.png",
+    ]
+    ball_entry = entry_from_path["tut/project-assets/ball.png"]
+    assert ball_entry == {
+        "path": "tut/project-assets/ball.png",
+        "size": len(png_data),
+        "hash": str(synthetic_repo.repo.create_blob(png_data)),
+        "mime_type": "image/png",
+        "width": 480,
+        "height": 360,
+    }
+    # Not a real PNG, so no dimensions:
+    assert "width" not in entry_from_path["tut/project-assets/sprite-0.png"]
+
+    shared_manifest = bundle.assets_manifest(TB.SharedAssetStore(), True)
+    assert sorted(entry["shared_path"] for entry in shared_manifest) == sorted(
+        f"assets/{entry['hash']}.png" for entry in manifest
+    )
@@ -1,17 +1,26 @@
 import pytest
 import re
 import logging
+import io
+import zipfile
+import sqlite3
+from collections import Counter
+from pathlib import Path
+from cached_property import cached_property
 
 import pygit2
+import bs4
 import pytchbuild.tutorialcompiler.fromgitrepo.tutorial_history as TH
+import pytchbuild.tutorialcompiler.fromgitrepo.tutorial_bundle as TB
 import pytchbuild.tutorialcompiler.fromgitrepo.errors as TCE
+import pytchbuild.tutorialcompiler.fromgitrepo.zip_writer as ZW
+import pytchbuild.tutorialcompiler.fromgitrepo.build_cache as BC
 
 
 class TestAsset:
     def test_str(self):
         fname = "alien.png"
-        data = b"not-a-real-PNG-file"
-        pa = TH.Asset(fname, data)
+        pa = TH.Asset(fname, "0" * 40, 19)
         assert str(pa) == '<Asset "alien.png": 19 bytes>'
 
     def test_from_delta(self, this_raw_repo):
@@ -25,8 +34,24 @@ class TestAsset:
 
         pa = TH.Asset.from_delta(this_raw_repo, delta)
         assert pa.path == "boing/project-assets/graphics/alien.png"
+        assert pa.size == 28
         assert pa.data == b"This is not a real PNG file!"
 
+    @pytest.mark.parametrize("chunk_size", [1, 5, 1 << 20])
+    def test_write_to_zipfile(self, synthetic_repo, monkeypatch, chunk_size):
+        monkeypatch.setattr(ZW.ZipWriter, "STREAM_CHUNK_SIZE", chunk_size)
+        tip_oid = synthetic_repo.add_tutorial("tut", n_asset_commits=1)
+        history = TH.ProjectHistory(synthetic_repo.repo.path, tip_oid.hex)
+        [asset] = history.all_assets
+        assert asset.size == len(b"not-really-a-PNG-tut-0")
+
+        zip_bytes = io.BytesIO()
+        with zipfile.ZipFile(zip_bytes, "w") as zfile:
+            asset.write_to_zipfile(ZW.ZipWriter(zfile))
+        with zipfile.ZipFile(zip_bytes, "r") as zfile:
+            got_data = zfile.read("tut/project-assets/sprite-0.png")
+        assert got_data == b"not-really-a-PNG-tut-0"
+
 
 class TestProjectCommit:
     def test_short_oid(self, this_raw_repo):
@@ -170,7 +195,7 @@ class TestProjectCommit:
 
     def test_sole_modify_against_parent(self, this_raw_repo):
         pc = TH.ProjectCommit(this_raw_repo, "e41e02c9be03")
-        assert pc.sole_modify_against_parent.old_file.path == "boing/code.py"
+        assert pc.sole_modify_against_parent.old_path == "boing/code.py"
 
     def test_sole_modify_against_parent_not_sole(self, this_raw_repo):
         pc = TH.ProjectCommit(this_raw_repo, "c2642880a6fc")
@@ -184,6 +209,24 @@ class TestProjectCommit:
                            match="not of type MODIFIED"):
             pc.sole_modify_against_parent
 
+    def test_sole_modify_against_parent_synthetic(self, synthetic_repo):
+        synthetic_repo.add_tutorial("tut", n_code_commits=1, n_asset_commits=1)
+        history = TH.ProjectHistory(synthetic_repo.repo.path, "tut")
+        text_commit, code_commit, asset_commit, base_commit = history.project_commits
+
+        delta = code_commit.sole_modify_against_parent
+        assert delta.old_path == delta.new_path == "tut/code.py"
+        assert code_commit.deltas_summary.modified_blob_pair == (
+            delta.old_id, delta.new_id
+        )
+        assert text_commit.sole_modify_against_parent.new_path == "tut/tutorial.md"
+        with pytest.raises(TCE.TutorialStructureError,
+                           match="not of type MODIFIED"):
+            asset_commit.sole_modify_against_parent
+        with pytest.raises(TCE.TutorialStructureError,
+                           match="not have exactly one"):
+            base_commit.sole_modify_against_parent
+
     def test_added_assets_one_asset(self, this_raw_repo):
         pc = TH.ProjectCommit(this_raw_repo, "9b40818176")
         got_assets = pc.added_assets
@@ -327,3 +370,296 @@ class TestProjectHistory:
         context, n_adds, n_dels = patch.line_stats
         assert n_adds == 4
         assert n_dels == 0
+
+
+class TestDeltasSummary:
+    @staticmethod
+    def file_delta(status, path, old_id="0" * 40, new_id="1" * 40):
+        return TH.FileDelta(status, path, path, old_id, new_id)
+
+    def test_sole_modify(self):
+        summary = TH.DeltasSummary.from_file_deltas([
+            self.file_delta(pygit2.GIT_DELTA_MODIFIED, "boing/code.py", "aa", "bb"),
+        ])
+        assert summary.kind == TH.DeltasSummary.Kind.SOLE_MODIFY
+        assert summary.sole_modified_basename == "code.py"
+        assert summary.modified_blob_pair == ("aa", "bb")
+        assert summary.added_blobs == ()
+
+    def test_project_assets(self):
+        summary = TH.DeltasSummary.from_file_deltas([
+            self.file_delta(pygit2.GIT_DELTA_ADDED, "boing/project-assets/a.png"),
+            self.file_delta(pygit2.GIT_DELTA_ADDED, "boing/project-assets/b.png"),
+        ])
+        assert summary.kind == TH.DeltasSummary.Kind.PROJECT_ASSETS
+        assert summary.n_project_asset_adds == 2
+        assert summary.sole_modified_basename is None
+        assert summary.modified_blob_pair is None
+        assert [path for path, _ in summary.added_blobs] == [
+            "boing/project-assets/a.png",
+            "boing/project-assets/b.png",
+        ]
+
+    def test_mixed(self):
+        summary = TH.DeltasSummary.from_file_deltas([
+            self.file_delta(pygit2.GIT_DELTA_ADDED, "boing/tutorial-assets/a.png"),
+            self.file_delta(pygit2.GIT_DELTA_MODIFIED, "boing/code.py"),
+        ])
+        assert summary.kind == TH.DeltasSummary.Kind.OTHER
+        assert summary.n_tutorial_asset_adds == 1
+        assert summary.n_deltas == 2
+        assert summary.modified_blob_pair is None
+
+    def test_top_level_path(self):
+        summary = TH.DeltasSummary.from_file_deltas([
+            self.file_delta(pygit2.GIT_DELTA_ADDED, "README"),
+        ])
+        assert summary.kind == TH.DeltasSummary.Kind.OTHER
+
+    def test_single_pass_over_long_history(self, synthetic_repo, monkeypatch):
+        # Benchmark in terms of delta traversals rather than time: asking all
+        # the classification questions of every commit should walk each
+        # commit's deltas exactly once.
+        tip_oid = synthetic_repo.add_tutorial("tut",
+                                              n_code_commits=300,
+                                              n_asset_commits=20)
+
+        n_traversals = Counter()
+
+        class CountingList(list):
+            def __init__(self, oid, *args):
+                super().__init__(*args)
+                self.oid = oid
+
+            def __iter__(self):
+                n_traversals[self.oid] += 1
+                return super().__iter__()
+
+        original_fun = TH.ProjectCommit.file_deltas_against_parent.func
+
+        def counting_file_deltas(self):
+            return CountingList(self.oid, original_fun(self))
+
+        monkeypatch.setattr(TH.ProjectCommit,
+                            "file_deltas_against_parent",
+                            cached_property(counting_file_deltas))
+
+        history = TH.ProjectHistory(synthetic_repo.repo.path, tip_oid.hex)
+        for pc in history.project_commits:
+            pc.summary_label
+            pc.modifies_python_code
+            pc.modifies_tutorial_text
+            pc.adds_project_assets
+            pc.adds_tutorial_assets
+            pc.added_assets
+
+        assert len(history.project_commits) == 322
+        assert len(n_traversals) == 322
+        assert set(n_traversals.values()) == {1}
+
+
+class TestProjectHistoryClose:
+    def test_closes_own_cache(self, synthetic_repo):
+        synthetic_repo.add_tutorial("tut")
+        history = TH.ProjectHistory(synthetic_repo.repo.path, "tut")
+        history.close()
+        with pytest.raises(sqlite3.ProgrammingError):
+            history.build_cache.get("things", "a")
+
+    def test_leaves_given_cache_open(self, synthetic_repo):
+        synthetic_repo.add_tutorial("tut")
+        build_cache = BC.BuildCache()
+        history = TH.ProjectHistory(synthetic_repo.repo.path, "tut",
+                                    build_cache=build_cache)
+        history.close()
+        assert build_cache.get("things", "a") is None
+
+
+class TestProjectHistoryRefresh:
+    @pytest.fixture
+    def history(self, synthetic_repo):
+        synthetic_repo.add_tutorial("tut", n_code_commits=3)
+        return TH.ProjectHistory(synthetic_repo.repo.path, "tut")
+
+    def test_unchanged(self, history):
+        commits = history.project_commits
+        assert history.refresh("tut") == 0
+        assert history.project_commits is commits
+
+    def test_tip_moves_forward(self, synthetic_repo, history):
+        assert history.ordered_commit_slugs == ["step-0", "step-1", "step-2"]
+        assert len(history.all_assets) == 2
+        old_commits = list(history.project_commits)
+
+        synthetic_repo.commit_changes(
+            "tut",
+            {"code.py": b"step_new = 99\n"},
+            "{#step-new} Add new step\n",
+        )
+        new_tip_oid = synthetic_repo.commit_changes(
+            "tut",
+            {"project-assets/new-sprite.png": b"new-sprite"},
+            "Add new sprite\n",
+        )
+
+        assert history.refresh("tut") == 2
+        assert history.project_commits[2:] == old_commits
+        assert history.tip_oid_string == new_tip_oid.hex
+        assert history.ordered_commit_slugs[-1] == "step-new"
+        assert history.slug_is_known("step-new")
+        assert history.final_code_text == "step_new = 99\n"
+        assert len(history.all_assets) == 3
+
+    @pytest.mark.parametrize("rewrite", [False, True], ids=["forward", "rewritten"])
+    def test_code_snapshots(self, synthetic_repo, history, rewrite):
+        def front_matter_code(bundle):
+            soup = bs4.BeautifulSoup(bundle.tutorial_html, "html.parser")
+            front_matter = soup.find("div", class_="front-matter")
+            return [bundle.code_snapshots[front_matter[f"data-{stem}-code-oid"]]
+                    for stem in ["initial", "complete"]]
+
+        bundle = TB.TutorialBundle.from_project_history(history, True)
+        assert front_matter_code(bundle) == ["", "step_0 = 0\nstep_1 = 1\nstep_2 = 2\n"]
+
+        if rewrite:
+            # New history with a different {base} commit, hence initial code.
+            synthetic_repo.repo.references.delete("refs/heads/tut")
+            files = {
+                "code.py": b"start = 0\n",
+                "summary.md": b"# Summary\n",
+                "tutorial.md": b"# Tutorial\n\n---\n\n{{< commit step-0 >}}\n",
+            }
+            synthetic_repo.commit("tut", "tut", files, "{base} Add skeleton\n")
+            files["code.py"] += b"step_0 = 0\n"
+            synthetic_repo.commit("tut", "tut", files, "{#step-0} Add step 0\n")
+            exp_code = ["start = 0\n", "start = 0\nstep_0 = 0\n"]
+        else:
+            synthetic_repo.commit_changes(
+                "tut",
+                {"code.py": b"step_new = 99\n"},
+                "{#step-new} Add new step\n",
+            )
+            exp_code = ["", "step_new = 99\n"]
+
+        history.refresh("tut")
+        bundle = TB.TutorialBundle.from_project_history(history, True)
+        assert history.final_code_blob_id == history.project_commits[0].blob_id_of_path(
+            history.python_code_path
+        )
+        assert front_matter_code(bundle) == exp_code
+
+    def test_duplicate_slug(self, synthetic_repo, history):
+        old_tip = history.tip_oid_string
+        synthetic_repo.commit_changes(
+            "tut",
+            {"code.py": b"again = True\n"},
+            "{#step-1} Re-use slug\n",
+        )
+        with pytest.raises(TCE.TutorialStructureError,
+                           match=r"duplicate .* \['step-1'\]"):
+            history.refresh("tut")
+        assert history.tip_oid_string == old_tip
+
+    def test_rewritten_history(self, synthetic_repo, history):
+        synthetic_repo.repo.references.delete("refs/heads/tut")
+        synthetic_repo.add_tutorial("tut", n_code_commits=5, n_asset_commits=0)
+
+        assert history.refresh("tut") == 7
+        assert len(history.project_commits) == 7
+        assert history.ordered_commit_slugs == [f"step-{i}" for i in range(5)]
+        assert history.all_assets == []
+
+    def test_working_directory_text(self, synthetic_repo):
+        synthetic_repo.add_tutorial("tut")
+        tutorial_path = Path(synthetic_repo.repo.workdir) / "tut/tutorial.md"
+        tutorial_path.parent.mkdir()
+        tutorial_path.write_text("First version\n")
+
+        history = TH.ProjectHistory(
+            synthetic_repo.repo.path,
+            "tut",
+            TH.ProjectHistory.TutorialTextSource.WORKING_DIRECTORY,
+        )
+        assert history.tutorial_text == "First version\n"
+
+        tutorial_path.write_text("Second, longer, version\n")
+        assert history.tutorial_text == "Second, longer, version\n"
+
+
+class TestCommitLinearAncestors:
+    def test_follows_first_parent(self, synthetic_repo):
+        repo = synthetic_repo.repo
+        synthetic_repo.add_tutorial("tut", n_code_commits=2, n_asset_commits=0)
+        side_tip = synthetic_repo.add_tutorial("side",
+                                               n_code_commits=1,
+                                               n_asset_commits=0)
+        main_tip = repo.references["refs/heads/tut"].target
+        merge_oid = repo.create_commit("refs/heads/tut",
+                                       synthetic_repo.signature,
+                                       synthetic_repo.signature,
+                                       "{#merge-side} Merge side\n",
+                                       repo[main_tip].tree.id,
+                                       [main_tip, side_tip])
+
+        history = TH.ProjectHistory(repo.path, "tut")
+        got_oids = [pc.oid for pc in history.project_commits]
+        assert got_oids[:2] == [merge_oid, main_tip]
+        assert len(got_oids) == 5
+        assert history.ordered_commit_slugs == ["step-0", "step-1", "merge-side"]
+
+    def test_stop_oid(self, synthetic_repo):
+        synthetic_repo.add_tutorial("tut", n_code_commits=4, n_asset_commits=0)
+        history = TH.ProjectHistory(synthetic_repo.repo.path, "tut")
+        stop_oid = history.commit_from_slug["step-2"].oid
+        tip_oid = history.project_commits[0].oid
+
+        got_commits = history.commit_linear_ancestors(tip_oid, stop_oid)
+        assert [pc.summary_label for pc in got_commits] == [
+            "tutorial-text",
+            "#step-3",
+            "#step-2",
+        ]
+
+
+class TestCodePatch:
+    @pytest.mark.parametrize(
+        "old_code, new_code",
+        [
+            (b"a\nb\nc\n", b"a\nB\nc\nd\n"),
+            (b"a\nb", b"a\nb\nc"),
+            (b"".join(f"{i}\n".encode() for i in range(40)),
+             b"".join(f"{i}\n".encode() for i in range(40) if i % 13 != 5)),
+        ])
+    def test_matches_pygit2(self, synthetic_repo, old_code, new_code):
+        repo = synthetic_repo.repo
+        old_id = repo.create_blob(old_code)
+        new_id = repo.create_blob(new_code)
+        pygit2_patch = repo[old_id].diff(repo[new_id])
+
+        patch = TH.CodePatch.from_blobs(repo, old_id, new_id)
+        assert patch.line_stats == pygit2_patch.line_stats
+        assert len(patch.hunks) == len(pygit2_patch.hunks)
+        for hunk, pygit2_hunk in zip(patch.hunks, pygit2_patch.hunks):
+            assert [(line.old_lineno, line.new_lineno, line.content)
+                    for line in hunk.lines] == [
+                (line.old_lineno, line.new_lineno, line.content)
+                for line in pygit2_hunk.lines
+            ]
+
+        round_tripped_patch = TH.CodePatch.from_json_value(patch.as_json_value())
+        assert round_tripped_patch == patch
+
+    def test_cached(self, synthetic_repo, monkeypatch):
+        synthetic_repo.add_tutorial("tut")
+        history_0 = TH.ProjectHistory(synthetic_repo.repo.path, "tut")
+        patch_0 = history_0.code_patch_against_parent("step-2")
+
+        def forbid_from_blobs(*args):
+            raise AssertionError("should have used cached patch")
+
+        monkeypatch.setattr(TH.CodePatch, "from_blobs", forbid_from_blobs)
+
+        history_1 = TH.ProjectHistory(synthetic_repo.repo.path, "tut")
+        patch_1 = history_1.code_patch_against_parent("step-2")
+        assert patch_1 == patch_0
+        assert patch_1.line_stats == (2, 1, 0)
@@ -1,8 +1,11 @@
 import pytest
 from dataclasses import dataclass
+from collections import OrderedDict
 from typing import List
 from bs4 import BeautifulSoup
 
+import pytchbuild.tutorialcompiler.fromgitrepo.build_cache as BC
+import pytchbuild.tutorialcompiler.fromgitrepo.tutorial_history as TH
 import pytchbuild.tutorialcompiler.fromgitrepo.tutorial_html_fragment as THF
 
 
@@ -47,27 +50,24 @@ class TestHunkTable:
             (-1, '<td class="linenum"></td>'),
             (10, '<td class="linenum"><pre>10</pre></td>'),
         ])
-    def test_table_data_from_line_number(self, soup, lineno, exp_html):
-        got_html = THF.table_data_from_line_number(soup, lineno)
-        assert str(got_html) == exp_html
+    def test_html_from_line_number(self, lineno, exp_html):
+        assert THF.html_from_line_number(lineno) == exp_html
 
-    def test_table_row_from_line(self, soup):
+    def test_html_from_line(self):
         line = MockHunkLine(10, 12, 'foo()')
-        got_html = THF.table_row_from_line(soup, line)
-        assert str(got_html) == (
+        assert THF.html_from_line(line) == (
             '<tr>'
             '<td class="linenum"><pre>10</pre></td>'
             '<td class="linenum"><pre>12</pre></td>'
             '<td><pre>foo()</pre></td></tr>'
         )
 
-    def test_table_from_hunk(self, soup):
+    def test_html_from_hunk(self):
         hunk = MockHunk([
             MockHunkLine(10, 12, 'foo()\n'),
             MockHunkLine(11, -1, 'bar()\n'),
         ])
-        got_html = THF.table_from_hunk(soup, hunk)
-        assert str(got_html) == (
+        assert THF.html_from_hunk(hunk) == (
             '<table>'
             '<tbody class="diff-unch">'
             '<tr>'
@@ -134,6 +134,70 @@ class TestHunkTable:
             '</div>'
         )
 
+    @pytest.mark.parametrize(
+        'content',
+        [
+            'foo()\n',
+            'if a < b and c > d:\n',
+            'x = "a & b"\n',
+            "x = 'single'\n",
+            'x = "double" + \'single\'\n',
+            '\n',
+        ])
+    def test_html_from_hunk_escaping(self, content):
+        hunk = MockHunk([
+            MockHunkLine(-1, 1, content),
+            MockHunkLine(-1, 2, content),
+            MockHunkLine(3, 3, content),
+            MockHunkLine(4, -1, content),
+            MockHunkLine(-1, 4, content),
+        ])
+        html = THF.html_from_hunk(hunk)
+
+        # Parsing and re-rendering with bs4 gives the same HTML, and the
+        # content comes back intact.
+        soup = BeautifulSoup(html, "html.parser")
+        assert str(soup) == html
+        assert [pre.get_text() for pre in soup.select("td:not(.linenum) pre")] == (
+            [content.rstrip("\n")] * 5
+        )
+        assert [tbody.get("data-added-text") for tbody in soup.find_all("tbody")] == (
+            [2 * content, None, None, content]
+        )
+
+    def test_added_text_assigned_once(self, monkeypatch):
+        # Each block of added lines gets its "data-added-text" built in one go,
+        # not a line at a time, which would take quadratic time.
+        attribute_calls = []
+        original_html_attribute = THF.html_attribute
+
+        def recording_html_attribute(name, value):
+            attribute_calls.append((name, value))
+            return original_html_attribute(name, value)
+
+        monkeypatch.setattr(THF, "html_attribute", recording_html_attribute)
+        added_lines_0 = [f"x_{i} = {i}\n" for i in range(100)]
+        added_lines_1 = [f"y_{i} = {i}\n" for i in range(50)]
+        hunk = MockHunk(
+            [MockHunkLine(-1, i, line) for i, line in enumerate(added_lines_0)]
+            + [MockHunkLine(1, 101, "unchanged()\n")]
+            + [MockHunkLine(-1, 102 + i, line) for i, line in enumerate(added_lines_1)]
+        )
+        THF.html_from_hunk(hunk)
+
+        assert [value for name, value in attribute_calls
+                if name == "data-added-text"] == [
+            "".join(added_lines_0), "".join(added_lines_1)
+        ]
+
+    def test_tables_whole_tutorial(self, synthetic_repo):
+        synthetic_repo.add_tutorial("tut", n_code_commits=20)
+        history = TH.ProjectHistory(synthetic_repo.repo.path, "tut")
+        html = str(THF.tutorial_div_from_project_history(history))
+
+        assert html.count('class="patch"') == 20
+        assert str(BeautifulSoup(html, "html.parser")) == html
+
 
 class TestHtmlFragment:
     @staticmethod
@@ -189,6 +253,63 @@ class TestHtmlFragment:
             assert front_matter.attrs["data-seek-to-chapter"] == "2"
 
 
+class TestCreditHtml:
+    CREDIT_MARKDOWN = "Drawn by *X*.\n\nCC-BY <b>4.0</b> & more.\n"
+
+    @pytest.fixture
+    def counted_renders(self, monkeypatch):
+        monkeypatch.setattr(THF, "credit_html_from_key", OrderedDict())
+        rendered_markdowns = []
+        original_rendered_credit_html = THF.rendered_credit_html
+
+        def counted_rendered_credit_html(credit_markdown):
+            rendered_markdowns.append(credit_markdown)
+            return original_rendered_credit_html(credit_markdown)
+
+        monkeypatch.setattr(THF, "rendered_credit_html",
+                            counted_rendered_credit_html)
+        return rendered_markdowns
+
+    def test_rendering(self, counted_renders):
+        assert THF.credit_html(self.CREDIT_MARKDOWN) == (
+            '<p>Drawn by <em>X</em>.</p>'
+            '<p>CC-BY <b>4.0</b> &amp; more.</p>'
+        )
+
+    def test_memoised(self, counted_renders):
+        html_0 = THF.credit_html(self.CREDIT_MARKDOWN)
+        html_1 = THF.credit_html(self.CREDIT_MARKDOWN)
+        assert html_1 == html_0
+        assert counted_renders == [self.CREDIT_MARKDOWN]
+
+        THF.credit_html("Something else.")
+        assert len(counted_renders) == 2
+
+    def test_memo_bounded(self, counted_renders, monkeypatch):
+        monkeypatch.setattr(THF, "CREDITS_CACHE_MAX_N_ENTRIES", 2)
+        THF.credit_html("Credit A.")
+        THF.credit_html("Credit B.")
+        THF.credit_html("Credit A.")  # Now more recently used than B
+        THF.credit_html("Credit C.")
+        assert len(THF.credit_html_from_key) == 2
+        assert counted_renders == ["Credit A.", "Credit B.", "Credit C."]
+
+        THF.credit_html("Credit A.")
+        THF.credit_html("Credit B.")
+        assert counted_renders[3:] == ["Credit B."]
+
+    def test_build_cache(self, counted_renders, monkeypatch):
+        build_cache = BC.BuildCache()
+        html_0 = THF.credit_html(self.CREDIT_MARKDOWN, build_cache)
+
+        # As if in a later process, with only the build-cache surviving:
+        monkeypatch.setattr(THF, "credit_html_from_key", OrderedDict())
+        html_1 = THF.credit_html(self.CREDIT_MARKDOWN, build_cache)
+
+        assert html_1 == html_0
+        assert counted_renders == [self.CREDIT_MARKDOWN]
+
+
 class TestPredicates:
     @pytest.mark.parametrize(
         'html,exp_is_relevant',
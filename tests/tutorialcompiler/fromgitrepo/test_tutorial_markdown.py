@@ -1,3 +1,6 @@
+import pytest
+import markdown
+import threading
 import pytchbuild.tutorialcompiler.fromgitrepo.tutorial_markdown as TM
 
 
@@ -16,3 +19,125 @@ class TestShortcodeParsing:
         soup = TM.soup_from_markdown_text(tutorial_md_text)
         ordered_commit_slugs = TM.ordered_commit_slugs_in_soup(soup)
         assert ordered_commit_slugs == ["import-pytch", "add-Alien-skeleton"]
+
+    @pytest.mark.parametrize(
+        "block,exp_is_shortcode",
+        [
+            ("{{< commit add-sprite >}}", True),
+            ("  {{< asset-credits >}}\n", True),
+            ("Some text with {{< commit add-sprite >}} in it", False),
+            ("{{< not a shortcode", False),
+            ("Plain paragraph", False),
+        ])
+    def test_shortcode_test(self, block, exp_is_shortcode):
+        processor = TM.ShortcodeProcessor(TM.markdown_engine().parser)
+        assert processor.test(None, block) == exp_is_shortcode
+
+    def test_shortcode_test_prescan(self, monkeypatch):
+        # Only blocks starting "{{<" are matched against the regex.
+        matched_blocks = []
+
+        class RecordingRegex:
+            def match(self, block):
+                matched_blocks.append(block)
+                return TM.ShortcodeProcessor.RE_SHORTCODE.match(block)
+
+        processor = TM.ShortcodeProcessor(TM.markdown_engine().parser)
+        monkeypatch.setattr(processor, "RE_SHORTCODE", RecordingRegex())
+        for block in ["Plain paragraph", "Some {{< commit a >}}", "# Heading"]:
+            assert not processor.test(None, block)
+        assert matched_blocks == []
+        assert processor.test(None, "  {{< commit a >}}")
+        assert matched_blocks == ["  {{< commit a >}}"]
+
+
+class TestMarkdownEngine:
+    # Texts which leave state in a Markdown instance, which must be reset
+    # before the next conversion.
+    TEXTS = [
+        "See [the docs][docs].\n\n[docs]: https://example.com/docs\n",
+        "See [the docs][docs] again.\n",
+        "<div class=\"raw\">Raw HTML</div>\n\nThen *text*.\n",
+        "# Tutorial\n\n{{< asset-credits >}}\n\n---\n\n{{< commit step-0 >}}\n",
+        "",
+        "Drawn by *Artist 0*.\n",
+    ]
+
+    def test_same_as_fresh_instance(self):
+        for text in self.TEXTS + self.TEXTS:
+            exp_html = markdown.markdown(text,
+                                         extensions=[TM.ShortcodeExtension()])
+            assert TM.html_from_markdown_text(text) == exp_html
+
+    def test_one_engine_per_thread(self):
+        engine = TM.markdown_engine()
+        assert TM.markdown_engine() is engine
+
+        engines_in_other_thread = []
+        thread = threading.Thread(
+            target=lambda: engines_in_other_thread.append(TM.markdown_engine())
+        )
+        thread.start()
+        thread.join()
+        assert engines_in_other_thread[0] is not engine
+
+    def test_engine_built_once_per_thread(self, monkeypatch):
+        engine_thread_ids = []
+
+        class CountingMarkdown(markdown.Markdown):
+            def __init__(self, *args, **kwargs):
+                engine_thread_ids.append(threading.get_ident())
+                super().__init__(*args, **kwargs)
+
+        monkeypatch.setattr(TM.markdown, "Markdown", CountingMarkdown)
+
+        # Fresh threads, so neither has an engine yet.
+        def convert_all():
+            for text in self.TEXTS + self.TEXTS:
+                TM.html_from_markdown_text(text)
+
+        threads = [threading.Thread(target=convert_all) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+            thread.join()
+
+        assert len(engine_thread_ids) == 2
+        assert len(set(engine_thread_ids)) == 2
+
+
+class TestHtmlParser:
+    def test_default(self, monkeypatch):
+        monkeypatch.delenv(TM.HTML_PARSER_ENV_VAR, raising=False)
+        assert TM.default_html_parser() == "html.parser"
+
+    def test_requested(self, monkeypatch):
+        pytest.importorskip("lxml")
+        monkeypatch.setenv(TM.HTML_PARSER_ENV_VAR, "lxml")
+        assert TM.default_html_parser() == "lxml"
+
+    def test_requested_unavailable(self, monkeypatch, caplog):
+        monkeypatch.setenv(TM.HTML_PARSER_ENV_VAR, "no-such-parser")
+        assert TM.default_html_parser() == "html.parser"
+        assert "not available" in caplog.text
+
+    @pytest.mark.parametrize(
+        "markdown_text",
+        [
+            "",
+            "Just some text",
+            "Drawn by *Artist 0*.\n",
+            ("# Title\n\nSome **strong** & <b>raw</b> text.\n\n---\n\n"
+             "## Chapter\n\n    x < 3 and y > 'z'\n\n"
+             "{{< commit add-sprite >}}\n\n* one\n* two\n\n"
+             "![Screenshot](screenshot.png \"title\")\n\n> quoted\n\n"
+             "<div class=\"raw\">raw block</div>\n\n&copy; café\n"),
+        ])
+    @pytest.mark.parametrize("parser", ["lxml", "html5lib"])
+    def test_same_soup_as_html_parser(self, markdown_text, parser):
+        pytest.importorskip(parser)
+        html = markdown.markdown(markdown_text,
+                                 extensions=[TM.ShortcodeExtension()])
+        exp_soup = TM.soup_from_html_fragment(html, "html.parser")
+        got_soup = TM.soup_from_html_fragment(html, parser)
+        assert str(got_soup) == str(exp_soup)
+        assert len(got_soup.contents) == len(exp_soup.contents)
@@ -0,0 +1,141 @@
+import pytest
+import io
+import os
+import zipfile
+
+import pytchbuild.tutorialcompiler.fromgitrepo.zip_writer as ZW
+
+
+class TestCompressionPolicy:
+    @pytest.mark.parametrize(
+        "path, data, exp_category",
+        [
+            ("tut/project-assets/sprite.png", b"x" * 10000, "stored"),
+            ("tut/project-assets/Pop.MP3", b"x" * 10000, "stored"),
+            ("tut/tutorial.html", os.urandom(10000), "text"),
+            ("tut/project-assets/level.dat", b"x" * 10000, "other"),
+            ("tut/project-assets/noise.dat", os.urandom(10000), "stored"),
+            # Too short to be worth probing:
+            ("tut/project-assets/noise.dat", os.urandom(100), "other"),
+        ]
+    )
+    def test_category(self, path, data, exp_category):
+        policy = ZW.CompressionPolicy()
+        assert policy.category(path, data) == exp_category
+
+    def test_compression(self):
+        policy = ZW.CompressionPolicy(text_deflate_level=9)
+        assert policy.compression("stored") == (zipfile.ZIP_STORED, None)
+        assert policy.compression("text") == (zipfile.ZIP_DEFLATED, 9)
+        assert policy.compression("other") == (zipfile.ZIP_DEFLATED, 6)
+
+
+class TestZipWriter:
+    def test_write(self):
+        contents = {
+            "tut/tutorial.html": b"<div>Hello world</div>" * 100,
+            "tut/project-assets/sprite.png": os.urandom(1000),
+            "tut/project-assets/level.dat": memoryview(b"\0" * 10000),
+        }
+
+        out_file = io.BytesIO()
+        zip_writer = ZW.ZipWriter.for_new_file(out_file)
+        for path, data in contents.items():
+            zip_writer.write(path, data)
+        zip_writer.close()
+
+        zfile = zipfile.ZipFile(out_file, "r")
+        assert {info.filename: info.compress_type for info in zfile.infolist()} == {
+            "tut/tutorial.html": zipfile.ZIP_DEFLATED,
+            "tut/project-assets/sprite.png": zipfile.ZIP_STORED,
+            "tut/project-assets/level.dat": zipfile.ZIP_DEFLATED,
+        }
+        for path, data in contents.items():
+            assert zfile.read(path) == bytes(data)
+
+        stats = zip_writer.stats
+        assert sorted(stats) == ["other", "stored", "text"]
+        assert stats["stored"].n_bytes_in == stats["stored"].n_bytes_out == 1000
+        assert stats["text"].n_bytes_in == 2200
+        assert stats["text"].n_bytes_out < 2200
+        assert stats["other"].n_members == 1
+        assert len(zip_writer.stats_lines) == 3
+
+    @pytest.mark.parametrize("seekable", [True, False])
+    def test_threaded_matches_serial(self, monkeypatch, seekable):
+        # Fix the timestamp so the two zipfiles can be compared byte-for-byte.
+        monkeypatch.setattr(ZW.time, "localtime", lambda t: (2020, 1, 1, 0, 0, 0))
+        contents = [
+            (f"tut/file-{i}.{suffix}", (f"line {i}\n" * 1000 * i).encode())
+            for i in range(40)
+            for suffix in ["html", "png", "dat"]
+        ]
+
+        def zipfile_bytes(n_threads):
+            out_file = io.BytesIO()
+            if not seekable:
+                out_file.seekable = lambda: False
+            zip_writer = ZW.ZipWriter.for_new_file(out_file, n_threads=n_threads)
+            for path, data in contents:
+                zip_writer.write(path, data)
+            zip_writer.close()
+            return out_file.getvalue(), zip_writer.stats
+
+        serial_bytes, serial_stats = zipfile_bytes(1)
+        threaded_bytes, threaded_stats = zipfile_bytes(4)
+
+        if seekable:
+            assert threaded_bytes == serial_bytes
+
+        zfile = zipfile.ZipFile(io.BytesIO(threaded_bytes), "r")
+        assert zfile.testzip() is None
+        assert [(info.filename, zfile.read(info)) for info in zfile.infolist()] == contents
+
+        for category, stats in serial_stats.items():
+            assert threaded_stats[category].n_bytes_in == stats.n_bytes_in
+            assert threaded_stats[category].n_bytes_out == stats.n_bytes_out
+
+    def test_internals_present(self):
+        # If this fails, a new version of Python has changed zipfile's
+        # internals, and threaded compression will quietly not be used.
+        zfile = zipfile.ZipFile(io.BytesIO(), "w")
+        assert ZW.zipfile_supports_appending_compressed(zfile)
+        zip_writer = ZW.ZipWriter(zfile, n_threads=2)
+        assert zip_writer.executor is not None
+        zip_writer.close()
+
+    def test_internals_missing(self, monkeypatch, caplog):
+        monkeypatch.setattr(ZW, "ZIPFILE_INTERNALS",
+                            ZW.ZIPFILE_INTERNALS + ("_no_such_attribute",))
+        out_file = io.BytesIO()
+        zip_writer = ZW.ZipWriter.for_new_file(out_file, n_threads=4)
+        assert zip_writer.executor is None
+        assert "compressing on one thread" in caplog.text
+
+        zip_writer.write("tut/tutorial.html", b"<div>Hello world</div>")
+        zip_writer.close()
+        zfile = zipfile.ZipFile(out_file)
+        assert zfile.read("tut/tutorial.html") == b"<div>Hello world</div>"
+
+    def test_deterministic(self, monkeypatch):
+        def zipfile_bytes(date_time):
+            monkeypatch.setattr(ZW.time, "localtime", lambda t: date_time)
+            out_file = io.BytesIO()
+            zip_writer = ZW.ZipWriter.for_new_file(out_file, deterministic=True)
+            zip_writer.write("tut/tutorial.html", b"<div>Hello world</div>")
+            zip_writer.close()
+            return out_file.getvalue()
+
+        zip_bytes = zipfile_bytes((2020, 1, 1, 0, 0, 0))
+        assert zipfile_bytes((2021, 6, 30, 12, 34, 56)) == zip_bytes
+
+        [zinfo] = zipfile.ZipFile(io.BytesIO(zip_bytes)).infolist()
+        assert zinfo.date_time == (1980, 1, 1, 0, 0, 0)
+        assert zinfo.external_attr == 0o644 << 16
+
+    def test_path_prefix(self):
+        out_file = io.BytesIO()
+        zip_writer = ZW.ZipWriter.for_new_file(out_file, path_prefix="tutorials/v1/")
+        zip_writer.write("tut/tutorial.html", b"<div>Hello world</div>")
+        zip_writer.close()
+        assert zipfile.ZipFile(out_file).namelist() == ["tutorials/v1/tut/tutorial.html"]
@@ -0,0 +1,250 @@
+import pytest
+import io
+import gzip
+import bs4
+import json
+import tracemalloc
+import zipfile
+from contextlib import closing
+
+import pytchbuild.tutorialcompiler.gather_tutorials as GT
+import pytchbuild.tutorialcompiler.fromgitrepo.blob_cache as BLC
+import pytchbuild.tutorialcompiler.fromgitrepo.tutorial_history as TH
+import pytchbuild.tutorialcompiler.fromgitrepo.zip_writer as ZW
+
+
+@pytest.fixture
+def collection_repo(synthetic_repo):
+    dirnames = ["alpha", "beta", "gamma"]
+    for dirname in dirnames:
+        synthetic_repo.add_tutorial(dirname)
+    synthetic_repo.write_working_index(dirnames)
+    return synthetic_repo
+
+
+@pytest.fixture
+def collection(collection_repo):
+    with closing(GT.TutorialCollection.from_repo_path(
+            collection_repo.repo.workdir,
+            GT.TutorialCollection.IndexSource.WORKING_DIRECTORY
+    )) as collection:
+        yield collection
+
+
+class TestTutorialCollection:
+    def test_shared_repository(self, collection):
+        histories = [info.project_history
+                     for info in collection.tutorials.values()]
+        assert len(histories) == 3
+        assert all(h.repo is collection.repo for h in histories)
+        assert all(h.build_cache is collection.build_cache for h in histories)
+
+    def test_close(self, collection):
+        collection.close()
+        assert collection.repo is None
+        assert collection.build_cache is None
+
+    def test_write_new_zipfile(self, collection):
+        out_file = io.BytesIO()
+        collection.write_new_zipfile(None, out_file)
+        zfile = zipfile.ZipFile(out_file, "r")
+        names = zfile.namelist()
+        assert "tutorial-index.html" in names
+        for dirname in ["alpha", "beta", "gamma"]:
+            assert f"{dirname}/tutorial.html" in names
+            assert f"{dirname}/project-assets/sprite-0.png" in names
+
+    def test_index_json(self, collection):
+        out_file = io.BytesIO()
+        collection.write_new_zipfile("0123abcd", out_file)
+        zfile = zipfile.ZipFile(out_file, "r")
+        index = json.loads(zfile.read("tutorial-index.json"))
+
+        assert index["collection_sha1"] == "0123abcd"
+        entries = index["tutorials"]
+        assert [entry["dir_name"] for entry in entries] == ["alpha", "beta", "gamma"]
+        for entry, info in zip(entries, collection.tutorials.values()):
+            assert entry["name"] == info.name
+            assert entry["commit_id"] == info.project_history.tip_oid_string
+            assert entry["n_chapters"] == 1
+            dirname = entry["dir_name"]
+            assert entry["n_bytes"] == {
+                "tutorial_html": zfile.getinfo(f"{dirname}/tutorial.html").file_size,
+                "summary_html": zfile.getinfo(f"{dirname}/summary.html").file_size,
+                "assets": sum(len(f"not-really-a-PNG-{dirname}-{i}") for i in range(2)),
+                "code_snapshots": 0,
+            }
+
+    @pytest.mark.parametrize("maybe_collection_oid", [None, "0123abcd"])
+    def test_index_html_from_summaries(self, maybe_collection_oid):
+        dirnames_and_summaries = [
+            ("alpha", '<div class="tutorial-summary"><h1>A &amp; B</h1></div>'),
+            ('q"uo<te>', '<div class="tutorial-summary"><p>x &gt; y</p></div>'),
+        ]
+        got_html = GT.index_html_from_summaries(maybe_collection_oid,
+                                                dirnames_and_summaries)
+
+        # As built by parsing the summaries into a soup:
+        index_soup = bs4.BeautifulSoup('<div class="tutorial-index"></div>',
+                                       "html.parser")
+        index_div = index_soup.find("div")
+        if maybe_collection_oid is not None:
+            index_div["data-collection-sha1"] = maybe_collection_oid
+        for dirname, summary_html in dirnames_and_summaries:
+            summary_div = bs4.BeautifulSoup(summary_html, "html.parser").find("div")
+            summary_div["data-tutorial-name"] = dirname
+            index_div.append(summary_div)
+
+        assert got_html == str(index_soup)
+
+    def test_code_snapshots(self, collection):
+        out_file = io.BytesIO()
+        collection.write_new_zipfile(None, out_file, separate_code_snapshots=True)
+        zfile = zipfile.ZipFile(out_file, "r")
+        index = json.loads(zfile.read("tutorial-index.json"))
+        for entry in index["tutorials"]:
+            dirname = entry["dir_name"]
+            code_snapshots = json.loads(zfile.read(f"{dirname}/code-snapshots.json"))
+            # Empty initial code, and four steps:
+            assert len(code_snapshots) == 5
+            assert entry["n_bytes"]["code_snapshots"] == (
+                zfile.getinfo(f"{dirname}/code-snapshots.json").file_size
+            )
+            tutorial_html = zfile.read(f"{dirname}/tutorial.html").decode("utf-8")
+            assert "data-code-as-of-commit=" not in tutorial_html
+
+    def test_parallel_build(self, collection):
+        def zipfile_contents(n_jobs):
+            out_file = io.BytesIO()
+            collection.write_new_zipfile(None, out_file, n_jobs)
+            zfile = zipfile.ZipFile(out_file, "r")
+            return [(name, zfile.read(name)) for name in zfile.namelist()]
+
+        assert zipfile_contents(2) == zipfile_contents(1)
+
+    def test_build_plan(self, collection_repo, collection):
+        assert collection.build_plan() == [
+            ("Tutorial alpha", False),
+            ("Tutorial beta", False),
+            ("Tutorial gamma", False),
+        ]
+        collection.write_new_zipfile(None, io.BytesIO())
+        assert all(is_cached for _, is_cached in collection.build_plan())
+
+        collection_repo.commit_changes("beta", {"code.py": b"pass\n"}, "{#more} More\n")
+        collection_repo.write_working_index(["alpha", "beta"])
+        with closing(GT.TutorialCollection.from_repo_path(
+                collection_repo.repo.workdir,
+                GT.TutorialCollection.IndexSource.WORKING_DIRECTORY
+        )) as new_collection:
+            assert new_collection.build_plan() == [
+                ("Tutorial alpha", True),
+                ("Tutorial beta", False),
+            ]
+
+    def test_memory_does_not_grow_with_size(
+            self, make_synthetic_repo, tmp_path, monkeypatch
+    ):
+        def peak_memory_writing(n_tutorials):
+            # The shared blob cache grows, by design, up to its bound; give
+            # each build its own small one.
+            monkeypatch.setattr(TH, "shared_blob_cache", BLC.BlobCache(1 << 16))
+            repo = make_synthetic_repo(f"repo-{n_tutorials}")
+            dirnames = [f"tutorial-{i}" for i in range(n_tutorials)]
+            for dirname in dirnames:
+                repo.add_tutorial(dirname, n_code_commits=60)
+            repo.write_working_index(dirnames)
+
+            with closing(GT.TutorialCollection.from_repo_path(
+                    repo.repo.workdir,
+                    GT.TutorialCollection.IndexSource.WORKING_DIRECTORY
+            )) as collection:
+                tracemalloc.start()
+                try:
+                    collection.write_new_zipfile(None, tmp_path / f"{n_tutorials}.zip")
+                    return tracemalloc.get_traced_memory()[1]
+                finally:
+                    tracemalloc.stop()
+
+        # Warm up, so one-off costs (e.g., compiling regexes) are not counted:
+        peak_memory_writing(1)
+
+        peak_small = peak_memory_writing(3)
+        peak_large = peak_memory_writing(12)
+        # Each further tutorial keeps a little (its summary, its history's
+        # commits), but far less than building a bundle needs at its peak.
+        peak_per_extra_tutorial = (peak_large - peak_small) / 9
+        assert peak_per_extra_tutorial < 0.15 * peak_small
+
+    def test_deterministic(self, collection, monkeypatch):
+        def zipfile_bytes():
+            out_file = io.BytesIO()
+            collection.write_new_zipfile(None, out_file, deterministic=True)
+            return out_file.getvalue()
+
+        zip_bytes = zipfile_bytes()
+        # Second build takes bundles from the cache, and happens later:
+        monkeypatch.setattr(ZW.time, "localtime", lambda t: (2038, 1, 1, 0, 0, 0))
+        assert zipfile_bytes() == zip_bytes
+
+    def test_write_to_directory(self, collection, tmp_path):
+        out_file = io.BytesIO()
+        collection.write_new_zipfile(None, out_file, path_prefix="tutorials/v1")
+        zfile = zipfile.ZipFile(out_file, "r")
+
+        out_dir = tmp_path / "site-layer"
+        writer = collection.write_to_directory(None, out_dir, path_prefix="tutorials/v1")
+        assert list(writer.stats) == ["written"]
+
+        written_paths = sorted(str(p.relative_to(out_dir))
+                               for p in out_dir.rglob("*") if p.is_file())
+        assert written_paths == sorted(zfile.namelist())
+        for path in written_paths:
+            assert (out_dir / path).read_bytes() == zfile.read(path)
+
+        writer = collection.write_to_directory(None, out_dir, path_prefix="tutorials/v1")
+        assert list(writer.stats) == ["unchanged"]
+
+    def test_dedup_assets(self, collection_repo):
+        for dirname in ["alpha", "beta"]:
+            collection_repo.commit_changes(dirname,
+                                           {"project-assets/common.png": b"shared"},
+                                           "Add common sprite\n")
+
+        with closing(GT.TutorialCollection.from_repo_path(
+                collection_repo.repo.workdir,
+                GT.TutorialCollection.IndexSource.WORKING_DIRECTORY
+        )) as collection:
+            out_file = io.BytesIO()
+            collection.write_new_zipfile(None, out_file, dedup_assets=True)
+
+        zfile = zipfile.ZipFile(out_file, "r")
+        names = zfile.namelist()
+        assert not any("/project-assets/" in name for name in names)
+
+        shared_names = [name for name in names if name.startswith("assets/")]
+        # Two sprites in each of three tutorials, plus one common sprite:
+        assert len(shared_names) == 7
+        assert len(set(shared_names)) == 7
+
+        common_oid = collection_repo.repo.create_blob(b"shared")
+        common_name = f"assets/{common_oid}.png"
+        for dirname in ["alpha", "beta"]:
+            manifest = json.loads(zfile.read(f"{dirname}/project-assets.json"))
+            assert len(manifest) == 3
+            assert manifest[f"{dirname}/project-assets/common.png"] == common_name
+            for shared_name in manifest.values():
+                assert shared_name in shared_names
+        assert zfile.read(common_name) == b"shared"
+
+    def test_sidecars(self, collection, tmp_path):
+        out_dir = tmp_path / "site-layer"
+        collection.write_to_directory(None, out_dir, sidecar_encodings=["gzip"])
+        for path in ["tutorial-index.html",
+                     "alpha/tutorial.html",
+                     "alpha/summary.html",
+                     "alpha/project-assets.json"]:
+            sidecar_path = out_dir / (path + ".gz")
+            assert (gzip.decompress(sidecar_path.read_bytes())
+                    == (out_dir / path).read_bytes())
+        assert not (out_dir / "alpha/project-assets/sprite-0.png.gz").exists()